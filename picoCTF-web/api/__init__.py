@@ -4,7 +4,7 @@ import inspect
 import logging
 import traceback
 
-from flask import Flask, jsonify, session
+from flask import Flask, g, jsonify, session
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # these have to come first to avoid circular import issues
@@ -130,6 +130,13 @@ def create_app(config=None):
         response.headers.add("Access-Control-Allow-Headers", "Content-Type, *")
         response.headers.add("Cache-Control", "no-cache")
         response.headers.add("Cache-Control", "no-store")
+        if "rate_limit" in g:
+            limit, remaining, reset = g.rate_limit
+            response.headers["X-RateLimit-Limit"] = limit
+            response.headers["X-RateLimit-Remaining"] = remaining
+            response.headers["X-RateLimit-Reset"] = reset
+            if response.status_code == 429:
+                response.headers["Retry-After"] = reset
         with app.app_context():
             if app.debug:
                 response.headers.add("Access-Control-Allow-Origin", "*")
@@ -1,11 +1,28 @@
 """Module for interacting with the achievements."""
 
+import hashlib
+import json
+import logging
+import os
+import types
 from datetime import datetime
-from importlib.machinery import SourceFileLoader
-from os.path import join
+from os.path import getmtime, join
 
 import api
-from api import PicoException, log_action
+from api import PicoException
+
+log = logging.getLogger(__name__)
+
+# Pending events, consumed in batches by the process_achievements daemon
+ACHIEVEMENT_QUEUE_KEY = "achievement_events"
+# Oldest events are dropped past this length if the daemon is not running
+ACHIEVEMENT_QUEUE_MAX = 100000
+ACHIEVEMENT_BATCH_SIZE = 100
+# Event of achievements which do not specify one
+DEFAULT_ACHIEVEMENT_EVENT = "submit"
+
+# Compiled processor modules, by path: (mtime, sha256 of source, module)
+__processors = {}
 
 
 def get_achievement(aid):
@@ -93,71 +110,169 @@ def get_earned_achievements(tid):
     return achievements
 
 
-def get_processor(aid):
+def _load_processor(base_path, path):
     """
-    Return the processor module for a given achievement.
+    Get a processor module from the registry.
+
+    The module is only compiled again when its file's mtime and contents
+    have both changed.
 
     Args:
-        aid: the achievement id
+        base_path: the processor base path
+        path: the processor path, relative to the base path
     Returns:
         The processor module
-
     """
+    full_path = join(base_path, path)
     try:
-        path = get_achievement(aid)["processor"]
-        base_path = api.config.get_settings()["achievements"]["processor_base_path"]
-        return SourceFileLoader(path[:-3], join(base_path, path)).load_module()
+        mtime = getmtime(full_path)
+        cached = __processors.get(full_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[2]
+
+        with open(full_path, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+        if cached is not None and cached[1] == digest:
+            module = cached[2]
+        else:
+            module = types.ModuleType(path[:-3])
+            module.__file__ = full_path
+            exec(compile(source, full_path, "exec"), module.__dict__)
+        __processors[full_path] = (mtime, digest, module)
+        return module
     except FileNotFoundError:
         raise PicoException("Achievement processor is offline.")
 
 
-@log_action
-def process_achievement(aid, data):
+def load_processors():
     """
-    Determine whether or not an achievement has been earned.
+    Compile every processor module under the processor base path.
 
-    Should not be called directly.
+    Called when the achievement daemon starts, so that the first events do
+    not pay for compilation.
+    A processor that fails to compile is logged and skipped.
 
-    Args:
-        aid: the achievement id
-        data: additional data dictionary
+    Returns:
+        the number of processors loaded
     """
-    # If there is a logged in user, forward their uid and tid to
-    # the achievement processor
-    if api.user.is_logged_in():
-        curr_user = api.user.get_user()
-        data["uid"] = curr_user["uid"]
-        data["tid"] = curr_user["tid"]
+    base_path = api.config.get_settings()["achievements"]["processor_base_path"]
+    loaded = 0
+    for root, _, files in os.walk(base_path):
+        for name in files:
+            if name.endswith(".py"):
+                path = os.path.relpath(join(root, name), base_path)
+                try:
+                    _load_processor(base_path, path)
+                    loaded += 1
+                except Exception:
+                    log.exception("Could not load achievement processor %s", path)
+    return loaded
+
+
+def _earned_achievement(aid, data):
+    """Build an earned achievement document from assessment data."""
+    tid, uid = data.pop("tid"), data.pop("uid")
+    name, description = data.pop("name"), data.pop("description")
+    return {
+        "aid": aid,
+        "tid": tid,
+        "uid": uid,
+        "data": data,
+        "name": name,
+        "description": description,
+        "timestamp": datetime.utcnow().timestamp(),
+        "seen": False,
+    }
+
+
+def enqueue_achievement_event(event, data):
+    """
+    Queue an event for the achievement daemon.
 
-    return get_processor(aid).process(api, data)
+    Args:
+        event: event type, e.g., submit
+        data: dictionary with additional information necessary for assessment
+              must include tid, uid
+    """
+    with api.cache.get_conn().pipeline(transaction=False) as pipe:
+        pipe.rpush(ACHIEVEMENT_QUEUE_KEY, json.dumps({"event": event, "data": data}))
+        pipe.ltrim(ACHIEVEMENT_QUEUE_KEY, -ACHIEVEMENT_QUEUE_MAX, -1)
+        pipe.execute()
 
 
-def insert_earned_achievement(aid, data):
+def pop_achievement_events(count=ACHIEVEMENT_BATCH_SIZE):
     """
-    Store earned achievement for a user/team.
+    Remove a batch of events from the achievement queue.
 
     Args:
-        aid: the achievement id
-        data: the data necessary to assess the achievement
-              must include tid, uid
+        count: maximum number of events to remove
+    Returns:
+        List of (event, data) tuples, oldest first
     """
-    db = api.db.get_conn()
+    with api.cache.get_conn().pipeline() as pipe:
+        pipe.lrange(ACHIEVEMENT_QUEUE_KEY, 0, count - 1)
+        pipe.ltrim(ACHIEVEMENT_QUEUE_KEY, count, -1)
+        events, _ = pipe.execute()
+    return [(event["event"], event["data"]) for event in map(json.loads, events)]
 
-    tid, uid = data.pop("tid"), data.pop("uid")
-    name, description = data.pop("name"), data.pop("description")
 
-    db.earned_achievements.insert(
-        {
-            "aid": aid,
-            "tid": tid,
-            "uid": uid,
-            "data": data,
-            "name": name,
-            "description": description,
-            "timestamp": datetime.utcnow().timestamp(),
-            "seen": False,
-        }
-    )
+def process_achievement_batch(events):
+    """
+    Process the achievements for a batch of events.
+
+    Achievements and each team's earned achievements are read once per batch,
+    and the newly earned achievements are inserted together. Each event is
+    only assessed by the achievements of its type.
+
+    Args:
+        events: list of (event, data) tuples. data must include tid, uid
+    Returns:
+        the number of achievements earned
+    """
+    db = api.db.get_conn()
+    achievements = get_all_achievements()
+    tids = list({data["tid"] for _, data in events})
+
+    # The events' solves may have been made by other workers since the
+    # last refresh, and processors must see them
+    api.stats.get_solve_matrix(refresh=True)
+    earned = {tid: set() for tid in tids}
+    for instance in db.earned_achievements.find(
+        {"tid": {"$in": tids}}, {"_id": 0, "tid": 1, "aid": 1}
+    ):
+        earned[instance["tid"]].add(instance["aid"])
+
+    base_path = api.config.get_settings()["achievements"]["processor_base_path"]
+    earned_achievements = []
+    for event, data in events:
+        for achievement in achievements:
+            aid = achievement["aid"]
+            if achievement.get("event", DEFAULT_ACHIEVEMENT_EVENT) != event:
+                continue
+            if aid in earned[data["tid"]] and not achievement.get("multiple", False):
+                continue
+
+            try:
+                processor = _load_processor(base_path, achievement["processor"])
+                acquired, instance_info = processor.process(api, dict(data))
+            except Exception:
+                log.exception("Achievement processor %s failed", aid)
+                continue
+
+            if acquired:
+                instance = dict(
+                    data,
+                    name=achievement.get("name"),
+                    description=achievement.get("description"),
+                )
+                instance.update(instance_info)
+                earned_achievements.append(_earned_achievement(aid, instance))
+                earned[data["tid"]].add(aid)
+
+    if earned_achievements:
+        db.earned_achievements.insert_many(earned_achievements)
+    return len(earned_achievements)
 
 
 def process_achievements(event, data):
@@ -174,28 +289,7 @@ def process_achievements(event, data):
     if data.get("tid", None) is None:
         data["tid"] = api.user.get_user(uid=data["uid"])["tid"]
 
-    eligible_achievements = [
-        achievement
-        for achievement in get_all_achievements()
-        if achievement["aid"]
-        not in [earned_a["aid"] for earned_a in get_earned_achievements(data["tid"])]
-        or achievement.get("multiple", False)
-    ]
-
-    for achievement in eligible_achievements:
-        aid = achievement["aid"]
-
-        acquired, instance_info = process_achievement(aid, data)
-
-        info = {
-            "name": achievement.get("name"),
-            "description": achievement.get("description"),
-        }
-
-        info.update(instance_info)
-        data.update(info)
-        if acquired:
-            insert_earned_achievement(aid, data)
+    process_achievement_batch([(event, data)])
 
 
 def insert_achievement(
@@ -209,6 +303,7 @@ def insert_achievement(
     smallimage,
     disabled,
     multiple,
+    event=DEFAULT_ACHIEVEMENT_EVENT,
 ):
     """
     Insert an achievement object into the database.
@@ -223,6 +318,7 @@ def insert_achievement(
         smallimage: Path to the achievement thumbnail.
         disabled: Disable this achievement?
         multiple: Allow earning multiple instances of this achievement?
+        event: Type of the events assessed by the achievement, e.g. submit
     Returns:
         ID of the newly inserted achievement
     """
@@ -239,6 +335,7 @@ def insert_achievement(
             "smallimage": smallimage,
             "disabled": disabled,
             "multiple": multiple,
+            "event": event,
         }
     )
     return aid
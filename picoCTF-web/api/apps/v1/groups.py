@@ -14,7 +14,7 @@ from api import (
     require_teacher,
 )
 from bs4 import UnicodeDammit
-from flask import jsonify
+from flask import current_app, jsonify
 from flask_restplus import Namespace, Resource
 from marshmallow import (
     fields,
@@ -550,12 +550,14 @@ class ScoreboardPage(Resource):
             )
 
         req = scoreboard_page_req.parse_args(strict=True)
-        if req["search"] is not None:
-            page = api.stats.get_filtered_scoreboard_page(
-                {"group_id": group_id}, req["search"], req["page"] or 1
+        if req["search"] is None:
+            return current_app.response_class(
+                api.stats.get_scoreboard_page_json({"group_id": group_id}, req["page"]),
+                mimetype="application/json",
             )
-        else:
-            page = api.stats.get_scoreboard_page({"group_id": group_id}, req["page"])
+        page = api.stats.get_filtered_scoreboard_page(
+            {"group_id": group_id}, req["search"], req["page"] or 1
+        )
         return jsonify(
             {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
         )
@@ -592,8 +594,9 @@ class ScoreProgressionsResult(Resource):
             not api.user.is_logged_in() or not api.user.get_user()["admin"]
         ):
             raise PicoException("Must be admin to specify limit", 403)
+        progressions = api.stats.get_top_teams_score_progressions(
+            limit=(req["limit"] or 5), group_id=group_id
+        )
         return jsonify(
-            api.stats.get_top_teams_score_progressions(
-                limit=(req["limit"] or 5), group_id=group_id
-            )
+            api.stats.downsample_score_progressions(progressions, req["points"])
         )
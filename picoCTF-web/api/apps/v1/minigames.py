@@ -71,6 +71,7 @@ class MinigameSubmissionResponse(Resource):
                     "$inc": {"tokens": tokens_earned},
                 },
             )
+            api.cache.clear_request_memo()
 
         return jsonify(
             {
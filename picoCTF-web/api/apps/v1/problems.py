@@ -64,21 +64,32 @@ class ProblemList(Resource):
             category=req["category"], show_disabled=req["include_disabled"]
         )
 
-        # Add the unlocked, solved, review, and container fields
+        # Add the unlocked, solved, review, and container fields.
+        # Team-level data is fetched once up front rather than per problem.
         curr_user = api.user.get_user()
+        tid = curr_user["tid"]
+        is_teacher = curr_user.get("teacher", False)
+        is_admin = curr_user.get("admin", False)
+
+        pids = [problem["pid"] for problem in problems]
+        solves = api.stats.get_problem_solves_many(pids)
+        unlocked_pids = set(api.problem.get_unlocked_pids(tid))
+        solved_pids = set(api.problem.get_solved_pids(tid=tid))
+        if is_admin:
+            reviews = api.problem_feedback.get_problem_feedback_counts()
+        containers = {}
+        for container in api.docker.list_containers_db(tid):
+            containers.setdefault(container["pid"], container)
+
         for problem in problems:
             pid = problem["pid"]
-            tid = curr_user["tid"]
-            problem["solves"] = api.stats.get_problem_solves(pid)
-            problem["unlocked"] = pid in api.problem.get_unlocked_pids(tid)
-            problem["solved"] = pid in api.problem.get_solved_pids(tid=tid)
-            if curr_user.get("admin", False):
-                problem["reviews"] = api.problem_feedback.get_problem_feedback(
-                    pid=pid, count_only=True
-                )
-            containers = api.docker.submission_to_cid(tid, pid)
-            if containers.count() > 0:
-                problem["container"] = dict(containers.next())
+            problem["solves"] = solves[pid]
+            problem["unlocked"] = pid in unlocked_pids
+            problem["solved"] = pid in solved_pids
+            if is_admin:
+                problem["reviews"] = reviews.get(pid, {"likes": 0, "dislikes": 0})
+            if pid in containers:
+                problem["container"] = containers[pid]
 
         # Handle the solved_only param
         if req["solved_only"]:
@@ -86,8 +97,6 @@ class ProblemList(Resource):
 
         # Handle the unlocked_only param, which depends on user role
         # Unless just getting the count - then normal users allowed
-        is_teacher = api.user.get_user().get("teacher", False)
-        is_admin = api.user.get_user().get("admin", False)
         if req["unlocked_only"] is False:
             if req["count_only"] is False and not is_teacher and not is_admin:
                 raise PicoException(
@@ -106,10 +115,7 @@ class ProblemList(Resource):
             # that have not been unlocked by the current user's team.
             problems = [p for p in problems if (p["unlocked"] is True)]
             # Additionally, show only fields from the assigned instance.
-            problems = [
-                api.problem.filter_problem_instances(p, api.user.get_user()["tid"])
-                for p in problems
-            ]
+            problems = api.problem.filter_problems_instances(problems, tid)
             # Strip out admin-only fields
             problems = api.problem.sanitize_problem_data(problems)
 
@@ -102,9 +102,18 @@ achievement_req.add_argument(
     error="Specify whether this achievement can be earned multiple times "
     + "(true/false)",
 )
+achievement_req.add_argument(
+    "event",
+    required=False,
+    type=str,
+    default="submit",
+    location="json",
+    help="Type of the events assessed by this achievement, e.g. submit.",
+)
 achievement_patch_req = achievement_req.copy()
 for arg in achievement_patch_req.args:
     arg.required = False
+    arg.default = None
 
 # Shell server output schema
 # (This is too complex for reqparse to really handle, so we'll trust it.
@@ -811,6 +820,13 @@ score_progressions_req.add_argument(
     help="The number of top teams' score progressions to return. "
     + "Must be an admin to use this argument.",
 )
+score_progressions_req.add_argument(
+    "points",
+    required=False,
+    type=inputs.positive,
+    location="args",
+    help="The maximum number of entries in each score progression.",
+)
 
 # Group request
 group_req = reqparse.RequestParser()
@@ -993,3 +1009,16 @@ user_delete_req.add_argument(
     help="Deletion reason",
     error="The reason must be a string!",
 )
+
+# Statistics export request schema
+stats_export_req = reqparse.RequestParser()
+stats_export_req.add_argument(
+    "format",
+    required=False,
+    type=str,
+    choices=["json", "ndjson", "csv"],
+    default="json",
+    location="args",
+    help="Output format of the export",
+    error="format must be one of json, ndjson or csv",
+)
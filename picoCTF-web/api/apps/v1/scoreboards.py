@@ -2,7 +2,7 @@
 
 import api
 from api import block_before_competition, PicoException, require_admin
-from flask import jsonify
+from flask import current_app, jsonify
 from flask_restplus import Namespace, Resource
 
 from .schemas import score_progressions_req, scoreboard_page_req, scoreboard_req
@@ -73,14 +73,16 @@ class ScoreboardPage(Resource):
         scoreboard = api.scoreboards.get_scoreboard(scoreboard_id)
         if not scoreboard:
             raise PicoException("Scoreboard not found", 404)
-        if req["search"] is not None:
-            page = api.stats.get_filtered_scoreboard_page(
-                {"scoreboard_id": scoreboard_id}, req["search"], req["page"] or 1
-            )
-        else:
-            page = api.stats.get_scoreboard_page(
-                {"scoreboard_id": scoreboard_id}, req["page"]
+        if req["search"] is None:
+            return current_app.response_class(
+                api.stats.get_scoreboard_page_json(
+                    {"scoreboard_id": scoreboard_id}, req["page"]
+                ),
+                mimetype="application/json",
             )
+        page = api.stats.get_filtered_scoreboard_page(
+            {"scoreboard_id": scoreboard_id}, req["search"], req["page"] or 1
+        )
         return jsonify(
             {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
         )
@@ -105,8 +107,9 @@ class ScoreProgressionsResult(Resource):
             not api.user.is_logged_in() or not api.user.get_user()["admin"]
         ):
             raise PicoException("Must be admin to specify limit", 403)
+        progressions = api.stats.get_top_teams_score_progressions(
+            limit=(req["limit"] or 5), scoreboard_id=scoreboard_id
+        )
         return jsonify(
-            api.stats.get_top_teams_score_progressions(
-                limit=(req["limit"] or 5), scoreboard_id=scoreboard_id
-            )
+            api.stats.downsample_score_progressions(progressions, req["points"])
         )
@@ -1,11 +1,77 @@
 """Endpoints for getting statistical reports."""
+import csv
+import io
+import json
+
 import api
 from api import require_admin
-from flask import jsonify
+from flask import jsonify, Response, stream_with_context
 from flask_restplus import Namespace, Resource
 
+from .schemas import stats_export_req
+
 ns = Namespace("stats", "Statistical aggregations and reports")
 
+# Rows buffered before a chunk of CSV output is sent
+CSV_CHUNK_ROWS = 500
+
+
+def _export_json(rows):
+    """Stream rows as a JSON array."""
+    yield "["
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(row)
+    yield "]"
+
+
+def _export_ndjson(rows):
+    """Stream rows as newline-delimited JSON."""
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def _export_csv(rows, fields):
+    """Stream rows as CSV, a chunk of CSV_CHUNK_ROWS rows at a time."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % CSV_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _export(rows, fields, export_format, filename):
+    """
+    Stream an export of rows without materializing it in memory.
+
+    Args:
+        rows: iterable of dicts
+        fields: the keys of each row, in CSV column order
+        export_format: one of json, ndjson or csv
+        filename: attachment name used for CSV downloads
+    Returns:
+        a streamed Response
+    """
+    if export_format == "csv":
+        return Response(
+            stream_with_context(_export_csv(rows, fields)),
+            mimetype="text/csv",
+            headers={
+                "Content-Disposition": "attachment; filename={}.csv".format(filename)
+            },
+        )
+    elif export_format == "ndjson":
+        return Response(
+            stream_with_context(_export_ndjson(rows)), mimetype="application/x-ndjson"
+        )
+    return Response(
+        stream_with_context(_export_json(rows)), mimetype="application/json"
+    )
+
 
 @ns.route("/registration")
 class RegistrationStatus(Resource):
@@ -24,13 +90,17 @@ class SubmissionStatistics(Resource):
     """View submission statistics, broken down by problem."""
 
     @require_admin
+    @ns.expect(stats_export_req)
     def get(self):
         """Get submission statistics, broken down by problem name."""
-        return jsonify(
-            {
-                p["name"]: api.stats.get_problem_submission_stats(p["pid"])
-                for p in api.problem.get_all_problems(show_disabled=True)
-            }
+        req = stats_export_req.parse_args(strict=True)
+        stats = api.stats.get_all_problem_submission_stats()
+        problems = api.problem.get_all_problems(show_disabled=True)
+        if req["format"] == "json":
+            return jsonify({p["name"]: stats[p["pid"]] for p in problems})
+        rows = (dict(problem=p["name"], **stats[p["pid"]]) for p in problems)
+        return _export(
+            rows, ["problem", "valid", "invalid"], req["format"], "submissions"
         )
 
 
@@ -42,6 +112,13 @@ class DemographicInformation(Resource):
     """Get demographic information used in analytics."""
 
     @require_admin
+    @ns.expect(stats_export_req)
     def get(self):
         """Get demographic information used in analytics."""
-        return jsonify(api.stats.get_demographic_data())
+        req = stats_export_req.parse_args(strict=True)
+        return _export(
+            api.stats.iter_demographic_data(),
+            api.stats.DEMOGRAPHIC_FIELDS,
+            req["format"],
+            "demographics",
+        )
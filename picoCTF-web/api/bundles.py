@@ -4,6 +4,7 @@ from voluptuous import Required, Schema
 
 import api
 from api import check, validate
+from api.cache import memoize
 
 bundle_schema = Schema(
     {
@@ -44,6 +45,26 @@ def get_all_bundles():
     return list(db.bundles.find({}, {"_id": 0}))
 
 
+@memoize(local_timeout=60, tags=("bundles",))
+def get_unlock_graph():
+    """
+    Compile the enabled bundle dependencies into an unlock graph.
+
+    Returns:
+        dict mapping a problem's unique_name to the list of
+        (weightmap, threshold) requirements it must meet to be unlocked
+
+    """
+    graph = {}
+    for bundle in get_all_bundles():
+        if "dependencies" in bundle and bundle["dependencies_enabled"]:
+            for unique_name, dependency in bundle["dependencies"].items():
+                graph.setdefault(unique_name, []).append(
+                    (dependency["weightmap"], dependency["threshold"])
+                )
+    return graph
+
+
 def upsert_bundle(bundle):
     """
     Add or update a bundle.
@@ -65,11 +86,13 @@ def upsert_bundle(bundle):
     existing = db.bundles.find_one({"bid": bid}, {"_id": 0})
     if existing is not None:
         db.bundles.find_one_and_update({"bid": bid}, {"$set": bundle})
+        api.cache.invalidate(get_unlock_graph)
         return bid
 
     bundle["bid"] = bid
     bundle["dependencies_enabled"] = False
     db.bundles.insert(bundle)
+    api.cache.invalidate(get_unlock_graph)
     return bid
 
 
@@ -94,5 +117,5 @@ def set_bundle_dependencies_enabled(bid, enabled):
     if not success:
         return None
     else:
-        api.cache.clear()
+        api.cache.invalidate_tags("bundles")
         return bid
@@ -1,9 +1,17 @@
 """Caching Library using redis."""
 
+import inspect
 import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime
 from functools import wraps
 
-from flask import current_app
+import msgpack
+from flask import current_app, g, has_request_context
 from walrus import Walrus
 
 import api
@@ -11,18 +19,93 @@ import hashlib
 import pickle
 from api import PicoException
 
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
 log = logging.getLogger(__name__)
 
+# Pub/sub channel used to evict entries from every worker's local cache
+INVALIDATION_CHANNEL = "cache_invalidation"
+INVALIDATE_ALL = "*"
+
+# Sets of memoized keys, per tag and function
+TAG_KEY = "cache_tag:%s:%s"
+
+# Tag for results depending on an argument value, as in memoize(depends_on=...)
+DEPENDENCY_TAG = "%s=%s"
+
+# Previous values kept for memoize(stale_timeout=...), in the cache namespace
+STALE_KEY = "stale:%s"
+
+# Held while a single worker recomputes a memoized value
+LOCK_KEY = "cache_lock:%s"
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+# Published JSON pages of a scoreboard ZSet
+SCOREBOARD_PAGES_KEY = "%s:pages"
+# Time of the oldest change to a scoreboard ZSet missing from its pages
+SCOREBOARD_DIRTY_KEY = "%s:pages:dirty"
+# Last change whose pages were left for the next full publish
+SCOREBOARD_INCOMPLETE_KEY = "%s:pages:incomplete"
+# Counts the changes made to a scoreboard ZSet, to version its pages
+SCOREBOARD_CHANGES_KEY = "%s:changes"
+# Entries added to a scoreboard ZSet, scored by time, for its search indexes
+SCOREBOARD_ADDED_KEY = "%s:added"
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Set once the scoreboards keyed by a hash of their arguments are deleted
+LEGACY_SCOREBOARDS_MIGRATION = "migrations:legacy_scoreboards"
+LEGACY_SCOREBOARD_PATTERN = "scoreboard:" + "[0-9a-f]" * 32
+
+# Records a change to every page of a scoreboard
+SCOREBOARD_REPLACED_SCRIPT = """
+local change = redis.call("incr", KEYS[1])
+redis.call("set", KEYS[2], ARGV[1], "NX")
+redis.call("set", KEYS[3], change)
+return change
+"""
+
+# Counts a solve, only if the solve counts are cached
+COUNT_SOLVE_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 1 then
+    return redis.call("hincrby", KEYS[1], ARGV[1], 1)
+end
+return 0
+"""
+
 __redis = {
     "walrus": None,
     "cache": None,
     "zsets": {"scores": None},
+    "hashes": {"problem_solves": None},
 }
 
+__local = {"cache": None, "listener": None}
+
+# Tag -> names of the memoized functions carrying it
+__tags = {}
+
+# Function name -> seconds its stale values may be served after invalidation
+__stale_timeouts = {}
+
+# Argument name -> names of the memoized functions depending on it
+__dependents = {}
+
+# Memoized function -> its signature, for building keys
+__signatures = {}
+
 
 def get_conn():
     """Get a redis connection, reusing one if it exists."""
-    global __redis
     if __redis.get("walrus") is None:
         conf = current_app.config
         try:
@@ -42,34 +125,414 @@ def get_conn():
 
 def get_cache():
     """Get a walrus cache, reusing one if it exists."""
-    global __redis
     if __redis.get("cache") is None:
         __redis["cache"] = get_conn().cache(default_timeout=0)
     return __redis["cache"]
 
 
 def get_score_cache():
-    global __redis
     if __redis["zsets"].get("scores") is None:
         __redis["zsets"]["scores"] = get_conn().ZSet("scores")
     return __redis["zsets"]["scores"]
 
 
+def get_problem_solves_cache():
+    if __redis["hashes"].get("problem_solves") is None:
+        __redis["hashes"]["problem_solves"] = get_conn().Hash("problem_solves")
+    return __redis["hashes"]["problem_solves"]
+
+
+def count_problem_solve(pid):
+    """
+    Count a new solve of a problem in the cached solve counts.
+
+    Nothing is counted if the counts are not cached, as they will be
+    rebuilt from the submissions on the next read.
+
+    :param pid: the solved problem's pid
+    """
+    get_conn().eval(COUNT_SOLVE_SCRIPT, 1, get_problem_solves_cache().key, pid)
+
+
 def get_scoreboard_cache(**kwargs):
-    global __redis
-    scoreboard_name = "scoreboard:{}".format(_hash_key((), kwargs))
+    scoreboard_name = "scoreboard:{}".format(_format_arguments(sorted(kwargs.items())))
     if __redis["zsets"].get(scoreboard_name) is None:
         __redis["zsets"][scoreboard_name] = get_conn().ZSet(scoreboard_name)
     return __redis["zsets"][scoreboard_name]
 
 
+def delete_legacy_scoreboard_caches():
+    """
+    Delete the scoreboards keyed by a hash of their arguments, once.
+
+    Scoreboards are now keyed by their arguments themselves, so nothing
+    reads or removes the old ones.
+
+    :return: the number of scoreboards deleted
+    """
+    conn = get_conn()
+    if conn.exists(LEGACY_SCOREBOARDS_MIGRATION):
+        return 0
+    keys = list(conn.scan_iter(match=LEGACY_SCOREBOARD_PATTERN, count=1000))
+    if keys:
+        conn.delete(*keys)
+    conn.set(LEGACY_SCOREBOARDS_MIGRATION, 1)
+    return len(keys)
+
+
+def replace_scoreboard_cache(scoreboard, scores):
+    """
+    Atomically replace the contents of a scoreboard ZSet.
+
+    The old entries remain readable until the new ones are in place, so a
+    rebuild never exposes an empty scoreboard.
+
+    :param scoreboard: scoreboard cache ZSet
+    :param scores: dict of scoreboard key: score
+    """
+    pipe = get_conn().pipeline()
+    pipe.delete(scoreboard.key)
+    if scores:
+        pipe.zadd(scoreboard.key, scores)
+    # Every page has changed, so leave them for the next full publish
+    pipe.eval(
+        SCOREBOARD_REPLACED_SCRIPT,
+        3,
+        SCOREBOARD_CHANGES_KEY % scoreboard.key,
+        SCOREBOARD_DIRTY_KEY % scoreboard.key,
+        SCOREBOARD_INCOMPLETE_KEY % scoreboard.key,
+        time.time(),
+    )
+    pipe.execute()
+
+
+def delete_scoreboard_cache(scoreboard):
+    """
+    Delete a scoreboard ZSet along with its published pages.
+
+    :param scoreboard: scoreboard cache ZSet
+    """
+    get_conn().delete(
+        scoreboard.key,
+        SCOREBOARD_PAGES_KEY % scoreboard.key,
+        SCOREBOARD_DIRTY_KEY % scoreboard.key,
+        SCOREBOARD_INCOMPLETE_KEY % scoreboard.key,
+        SCOREBOARD_CHANGES_KEY % scoreboard.key,
+        SCOREBOARD_ADDED_KEY % scoreboard.key,
+    )
+
+
+class LocalCache(object):
+    """
+    Bounded, per-process LRU cache with a timeout on each entry.
+
+    Sits in front of the shared redis cache for memoized functions which opt
+    in with memoize(local_timeout=...). Entries are evicted from every
+    worker through redis pub/sub whenever the shared entry is invalidated
+    or replaced.
+    """
+
+    def __init__(self, maxsize):
+        """Initialize an empty cache holding at most maxsize entries."""
+        self.maxsize = maxsize
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) for a live entry, else (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, timeout, generation):
+        """
+        Store a value, unless an invalidation arrived since generation.
+
+        This keeps a value read from redis just before an invalidation from
+        being cached locally just after it.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Evict a single entry."""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Evict every entry."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+def _listen_for_invalidations(pubsub, local_cache):
+    """Evict local cache entries as invalidations are published."""
+    try:
+        for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            key = message["data"].decode("utf-8")
+            if key == INVALIDATE_ALL:
+                local_cache.clear()
+            else:
+                local_cache.delete(key)
+    except Exception as error:
+        log.error("Local cache invalidation listener stopped: %s", error)
+    finally:
+        # Without invalidations the local entries can no longer be trusted
+        local_cache.clear()
+
+
+def get_local_cache():
+    """
+    Get this process' local cache, or None if it is disabled or unavailable.
+
+    Starts the invalidation listener on first use, and restarts it if it
+    has stopped.
+    """
+    if __local["cache"] is None:
+        maxsize = current_app.config.get("LOCAL_CACHE_SIZE", 0)
+        if not maxsize:
+            return None
+        __local["cache"] = LocalCache(maxsize)
+
+    listener = __local["listener"]
+    if listener is None or not listener.is_alive():
+        pubsub = get_conn().pubsub()
+        pubsub.subscribe(INVALIDATION_CHANNEL)
+        listener = threading.Thread(
+            target=_listen_for_invalidations,
+            args=(pubsub, __local["cache"]),
+            daemon=True,
+        )
+        listener.start()
+        __local["listener"] = listener
+        # Anything cached before the listener (re)started may be stale
+        __local["cache"].clear()
+    return __local["cache"]
+
+
+def _publish_invalidation(key, pipe=None):
+    # Evict here right away so this worker reads its own writes, rather than
+    # waiting for the listener to receive the message
+    local_cache = __local["cache"]
+    if local_cache is not None:
+        if key == INVALIDATE_ALL:
+            local_cache.clear()
+        else:
+            local_cache.delete(key)
+    (pipe or get_conn()).publish(INVALIDATION_CHANNEL, key)
+
+
+def request_memo(key, fetch):
+    """
+    Fetch a value at most once per request.
+
+    Values are held on flask.g and a private copy is returned to each caller,
+    so mutating the result does not affect later lookups. Outside of a
+    request the value is always fetched.
+
+    Args:
+        key: hashable key identifying the value within the request
+        fetch: zero-argument callable producing the value
+    Returns:
+        the (possibly memoized) value
+    """
+    if not has_request_context():
+        return fetch()
+    memo = g.setdefault("request_memo", {})
+    if key not in memo:
+        memo[key] = fetch()
+    return deepcopy(memo[key])
+
+
+def clear_request_memo():
+    """Forget everything memoized for the current request."""
+    if has_request_context():
+        g.pop("request_memo", None)
+
+
 def clear():
-    global __redis
     if __redis.get("walrus") is not None:
         __redis["walrus"].flushdb()
+        _publish_invalidation(INVALIDATE_ALL)
+
+
+class PickleSerializer(object):
+    """Stores values as pickles, the same as walrus does."""
+
+    def dumps(self, value):
+        """Serialize a value to bytes."""
+        return pickle.dumps(value)
+
+    def loads(self, data):
+        """Deserialize a value from bytes."""
+        return pickle.loads(data)
+
+
+class MsgpackSerializer(object):
+    """
+    Stores values as msgpack, compressing those over a size threshold.
+
+    More compact and quicker to load than pickle, but limited to the types
+    msgpack supports plus datetimes. Tuples are loaded back as lists.
+    """
 
+    DATETIME_EXT = 1
+
+    RAW = b"\x00"
+    ZLIB = b"\x01"
+    LZ4 = b"\x02"
+
+    def __init__(self, compress_threshold=1024):
+        """
+        Initialize the serializer.
+
+        Args:
+            compress_threshold: size in bytes above which values are
+                                compressed, with lz4 if it is installed
+                                and zlib otherwise
+        """
+        self.compress_threshold = compress_threshold
+
+    @classmethod
+    def _default(cls, value):
+        if isinstance(value, datetime):
+            return msgpack.ExtType(cls.DATETIME_EXT, value.isoformat().encode())
+        raise TypeError("Cannot serialize {!r}".format(value))
+
+    @classmethod
+    def _ext_hook(cls, code, data):
+        if code == cls.DATETIME_EXT:
+            return datetime.fromisoformat(data.decode())
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, value):
+        """Serialize a value to bytes."""
+        data = msgpack.packb(value, default=self._default, use_bin_type=True)
+        if len(data) <= self.compress_threshold:
+            return self.RAW + data
+        if lz4 is not None:
+            return self.LZ4 + lz4.frame.compress(data)
+        return self.ZLIB + zlib.compress(data)
+
+    def loads(self, data):
+        """Deserialize a value from bytes."""
+        header, data = data[:1], data[1:]
+        if header == self.LZ4:
+            data = lz4.frame.decompress(data)
+        elif header == self.ZLIB:
+            data = zlib.decompress(data)
+        return msgpack.unpackb(
+            data, ext_hook=self._ext_hook, raw=False, strict_map_key=False
+        )
+
+
+# Serializers selectable by name with memoize(serializer=...)
+SERIALIZERS = {"pickle": PickleSerializer(), "msgpack": MsgpackSerializer()}
+
+
+def _load(key, serializer):
+    """Get a memoized value, or _MISSING if it is not cached."""
+    data = get_conn().get(get_cache().make_key(key))
+    if data is None:
+        return _MISSING
+    return serializer.loads(data)
+
+
+def _set(pipe, key, data, timeout):
+    if timeout:
+        pipe.setex(key, int(timeout), data)
+    else:
+        pipe.set(key, data)
+
+
+def _store(
+    key,
+    value,
+    timeout=None,
+    tags=(),
+    stale_timeout=None,
+    serializer=SERIALIZERS["pickle"],
+):
+    """Set a memoized value, along with its stale copy and tag entries."""
+    _cache = get_cache()
+    data = serializer.dumps(value)
+    name = key.split(":", 1)[0]
+
+    pipe = get_conn().pipeline()
+    _set(pipe, _cache.make_key(key), data, timeout)
+    if stale_timeout is not None:
+        _set(
+            pipe,
+            _cache.make_key(STALE_KEY % key),
+            data,
+            timeout and timeout + stale_timeout,
+        )
+    for tag in tags:
+        pipe.sadd(TAG_KEY % (tag, name), key)
+    pipe.execute()
+
+
+def _expire_stale(pipe, keys):
+    """Limit the stale copies of the given keys to their staleness window."""
+    _cache = get_cache()
+    for key in keys:
+        stale_timeout = __stale_timeouts.get(key.split(":", 1)[0])
+        if stale_timeout is not None:
+            pipe.expire(_cache.make_key(STALE_KEY % key), stale_timeout)
+
+
+def _single_flight(key, compute, serve_stale, serializer):
+    """
+    Compute a missing value in only one worker at a time.
+
+    The worker holding the lock computes and stores the value. Others return
+    the stale copy if allowed and available, or else wait for the new value.
+    Should the lock holder fail or take too long, they compute it themselves.
+    """
+    conn = get_conn()
+    lock_key = LOCK_KEY % key
+    token = api.common.token()
 
-def __insert_cache(f, *args, **kwargs):
+    if conn.set(lock_key, token, nx=True, ex=LOCK_TIMEOUT):
+        try:
+            return compute()
+        finally:
+            conn.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    if serve_stale:
+        value = _load(STALE_KEY % key, serializer)
+        if value is not _MISSING:
+            return value
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = _load(key, serializer)
+        if value is not _MISSING:
+            return value
+        if not conn.exists(lock_key):
+            break
+    return compute()
+
+
+def __insert_cache(f, tags, stale_timeout, serializer, *args, **kwargs):
     """
     Directly upserting without first invalidating, thus keeping a memoized
     value available without lapse
@@ -77,23 +540,106 @@ def __insert_cache(f, *args, **kwargs):
     if f == api.stats.get_score:
         raise PicoException("Error: Do not manually reset_cache get_score")
     else:
-        key = "%s:%s" % (f.__name__, _hash_key(args, kwargs))
+        key = make_key(f, args, kwargs)
         value = f(*args, **kwargs)
-        get_cache().set(key, value)
+        _store(
+            key, value, tags=tags, stale_timeout=stale_timeout, serializer=serializer
+        )
+        _publish_invalidation(key)
         return value
 
 
-def memoize(_f=None, **cached_kwargs):
-    """walrus.Cache.cached wrapper that reuses shared cache."""
+_MISSING = object()
+
+
+def _dependency_tags(arguments, depends_on):
+    """Tag a call with the values of the arguments it depends on."""
+    return tuple(
+        DEPENDENCY_TAG % (name, arguments[name])
+        for name in depends_on
+        if arguments.get(name) is not None
+    )
+
+
+def memoize(
+    _f=None,
+    local_timeout=None,
+    tags=(),
+    depends_on=(),
+    single_flight=False,
+    stale_timeout=None,
+    serializer="pickle",
+    **cached_kwargs
+):
+    """
+    walrus.Cache.cached wrapper that reuses shared cache.
+
+    :param local_timeout: also keep results in the per-process local cache
+                          for this many seconds. Locally cached results are
+                          shared between callers, so only use this for
+                          functions whose results are never mutated.
+    :param tags: names of the data the results depend on. Every result
+                 carrying a tag can be dropped with invalidate_tags().
+    :param depends_on: names of arguments, such as "tid" or "uid", whose
+                       values the results depend on. Every result for a
+                       value can be dropped with invalidate_many().
+    :param single_flight: on a miss, let only one worker at a time call the
+                          function while the others wait for its result.
+    :param stale_timeout: implies single_flight, but rather than waiting,
+                          other workers are served the previous result. It
+                          remains available for this many seconds after
+                          expiring or being invalidated.
+    :param serializer: name of the entry in SERIALIZERS used to store results
+    """
 
     def decorator(f):
+        for tag in tags:
+            __tags.setdefault(tag, set()).add(f.__name__)
+        for name in depends_on:
+            __dependents.setdefault(name, set()).add(f.__name__)
+        if stale_timeout is not None:
+            __stale_timeouts[f.__name__] = stale_timeout
+        timeout = cached_kwargs.get("timeout")
+        _serializer = SERIALIZERS[serializer]
+
         @wraps(f)
         def wrapper(*args, **kwargs):
             if kwargs.get("reset_cache", False):
                 kwargs.pop("reset_cache", None)
-                return __insert_cache(f, *args, **kwargs)
-            else:
-                return get_cache().cached(**cached_kwargs)(f)(*args, **kwargs)
+                call_tags = tags + _dependency_tags(
+                    _bind_arguments(f, args, kwargs), depends_on
+                )
+                return __insert_cache(
+                    f, call_tags, stale_timeout, _serializer, *args, **kwargs
+                )
+
+            arguments = _bind_arguments(f, args, kwargs)
+            key = "%s:%s" % (f.__name__, _format_arguments(arguments.items()))
+            local_cache = get_local_cache() if local_timeout else None
+            if local_cache is not None:
+                hit, value = local_cache.get(key)
+                if hit:
+                    return value
+                generation = local_cache.generation
+
+            def compute():
+                value = f(*args, **kwargs)
+                call_tags = tags + _dependency_tags(arguments, depends_on)
+                _store(key, value, timeout, call_tags, stale_timeout, _serializer)
+                return value
+
+            value = _load(key, _serializer)
+            if value is _MISSING:
+                if single_flight or stale_timeout is not None:
+                    value = _single_flight(
+                        key, compute, stale_timeout is not None, _serializer
+                    )
+                else:
+                    value = compute()
+
+            if local_cache is not None:
+                local_cache.set(key, value, local_timeout, generation)
+            return value
 
         return wrapper
 
@@ -103,8 +649,49 @@ def memoize(_f=None, **cached_kwargs):
         return decorator(_f)
 
 
-def _hash_key(a, k):
-    return hashlib.md5(pickle.dumps((a, k))).hexdigest()
+def _bind_arguments(f, args, kwargs):
+    """Bind a call's arguments to f's parameters, filling in defaults."""
+    f = getattr(f, "__wrapped__", f)
+    signature = __signatures.get(f)
+    if signature is None:
+        signature = __signatures[f] = inspect.signature(f)
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def _format_value(value):
+    # Strings are quoted, so that they can't be mistaken for other types
+    # or contain the separators of other arguments
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return repr(value)
+    # Containers and objects are hashed to keep keys short
+    return hashlib.md5(pickle.dumps(value)).hexdigest()
+
+
+def _format_arguments(items):
+    return ":".join("%s=%s" % (name, _format_value(value)) for name, value in items)
+
+
+def make_key(f, args, kwargs):
+    """
+    Build the cache key for a call to a memoized function.
+
+    Arguments are bound to the function's parameters with defaults applied,
+    so however the same values are passed the key is the same, e.g.
+    get_solved_problems:tid='...':uid=None:category=None:show_disabled=False
+
+    Args:
+        f: the memoized function, wrapped or not
+        args: positional arguments of the call
+        kwargs: keyword arguments of the call
+    Returns:
+        the key, without the cache namespace prefix
+    """
+    return "%s:%s" % (
+        f.__name__,
+        _format_arguments(_bind_arguments(f, args, kwargs).items()),
+    )
 
 
 def get_scoreboard_key(team):
@@ -154,5 +741,82 @@ def invalidate(f, *args, **kwargs):
         key = args[0]
         get_score_cache().remove(key)
     else:
-        key = "%s:%s" % (f.__name__, _hash_key(args, kwargs))
-        get_cache().delete(key)
+        key = make_key(f, args, kwargs)
+        pipe = get_conn().pipeline()
+        pipe.delete(get_cache().make_key(key))
+        _expire_stale(pipe, [key])
+        pipe.execute()
+        _publish_invalidation(key)
+
+
+def _drop_tag_sets(tag_keys):
+    """Atomically empty the given tag sets, returning the keys they held."""
+    pipe = get_conn().pipeline()
+    for tag_key in tag_keys:
+        pipe.smembers(tag_key)
+    pipe.delete(*tag_keys)
+    members = pipe.execute()[:-1]
+    return {key.decode() for keys in members for key in keys}
+
+
+def invalidate_tags(*tags):
+    """
+    Drop every memoized value carrying any of the given tags.
+
+    Unlike clear(), this leaves unrelated cached values, scoreboards and
+    rate limits in place.
+
+    Args:
+        tags: tags passed to memoize()
+    """
+    tag_keys = [TAG_KEY % (tag, name) for tag in tags for name in __tags.get(tag, ())]
+    if not tag_keys:
+        return
+
+    keys = _drop_tag_sets(tag_keys)
+    pipe = get_conn().pipeline()
+    if keys:
+        pipe.delete(*[get_cache().make_key(key) for key in keys])
+        _expire_stale(pipe, keys)
+    # Local entries are short-lived, so dropping them all is cheap
+    _publish_invalidation(INVALIDATE_ALL, pipe)
+    pipe.execute()
+
+
+def invalidate_many(*calls, **dependencies):
+    """
+    Invalidate several memoized values in a single pipeline.
+
+    Args:
+        calls: (f, *args) tuples naming individual values, as would be
+               passed to invalidate()
+        dependencies: argument values, such as tid=... or uid=[...]. Drops
+                      every value of functions memoized with depends_on
+                      that argument, along with the get_score entries for
+                      those ids. A list drops the values for each id in it.
+    """
+    dependencies = {
+        arg: list(values) if isinstance(values, (list, tuple, set)) else [values]
+        for arg, values in dependencies.items()
+    }
+    tag_keys = [
+        TAG_KEY % (DEPENDENCY_TAG % (arg, value), name)
+        for arg, values in dependencies.items()
+        for value in values
+        for name in __dependents.get(arg, ())
+    ]
+    keys = _drop_tag_sets(tag_keys) if tag_keys else set()
+    for f, *args in calls:
+        keys.add(make_key(f, args, {}))
+
+    _cache = get_cache()
+    pipe = get_conn().pipeline()
+    if keys:
+        pipe.delete(*[_cache.make_key(key) for key in keys])
+        _expire_stale(pipe, keys)
+    ids = [value for values in dependencies.values() for value in values]
+    if ids:
+        pipe.zrem(get_score_cache().key, *ids)
+    for key in keys:
+        _publish_invalidation(key, pipe)
+    pipe.execute()
@@ -216,17 +216,50 @@ The {competition_name} Team""",  # noqa (79char)
     "group_limit": 20,
 }
 
+# Redis counter bumped on every settings change
+SETTINGS_VERSION_KEY = "settings_version"
+
+__settings = {"version": None, "settings": None}
+
 
 def get_settings():
-    """Retrieve settings from the database."""
+    """
+    Retrieve settings from the database.
+
+    The settings are kept in-process and only re-read from the database
+    when the settings version counter in redis has changed.
+    """
+    global __settings
+    _cache = api.cache.get_conn()
+
+    # Always read the version before the settings themselves, so that a
+    # concurrent change can only make the cached copy look older than it is
+    version = _cache.get(SETTINGS_VERSION_KEY)
+    if version is None:
+        _cache.setnx(SETTINGS_VERSION_KEY, 0)
+        version = _cache.get(SETTINGS_VERSION_KEY)
+    if __settings["settings"] is not None and __settings["version"] == version:
+        return deepcopy(__settings["settings"])
+
     db = api.db.get_conn()
     settings = db.settings.find_one({}, {"_id": 0})
     if settings is None:
         db.settings.insert(default_settings.copy())
-        return default_settings
+        settings = default_settings
+    __settings = {"version": version, "settings": deepcopy(settings)}
     return settings
 
 
+def invalidate_settings():
+    """
+    Make every process re-read the settings from the database.
+
+    Must be called after any change to the settings document, including
+    ones made outside of the API.
+    """
+    api.cache.get_conn().incr(SETTINGS_VERSION_KEY)
+
+
 def merge_new_settings():
     """Add any new default_settings into the database."""
 
@@ -244,6 +277,7 @@ def merge_new_settings():
     merged = merge(default_settings, db_settings)
     db = api.db.get_conn()
     db.settings.find_one_and_update({}, {"$set": merged})
+    invalidate_settings()
 
 
 def change_settings(changes):
@@ -282,6 +316,7 @@ def change_settings(changes):
     check_keys(settings, changes)
     db = api.db.get_conn()
     db.settings.find_one_and_update({}, {"$set": changes})
+    invalidate_settings()
 
 
 def check_competition_active():
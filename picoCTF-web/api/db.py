@@ -101,6 +101,11 @@ def get_conn():
         __connection.submissions.create_index("tid")
         __connection.submissions.create_index("suspicious")
 
+        __connection.team_solves.create_index(
+            [("tid", 1), ("pid", 1)], unique=True, name="unique team solve"
+        )
+        __connection.team_solves.create_index("solve_time")
+
         __connection.teams.create_index(
             "team_name", unique=True, name="unique team_names"
         )
@@ -11,11 +11,15 @@ MONGO_USER = None
 MONGO_PW = None
 MONGO_REPLICA_SETTINGS = None
 MONGO_TLS_SETTINGS = None
+AUDIT_LOG_QUEUE_SIZE = 10000        # buffered audit records before dropping
+AUDIT_LOG_BATCH_SIZE = 100          # audit records per insert
+AUDIT_LOG_FLUSH_INTERVAL = 1        # seconds before a partial batch is stored
 
 REDIS_DB_NUMBER = 0
 REDIS_ADDR = "127.0.0.1"
 REDIS_PORT = 6379
 REDIS_PW = None
+LOCAL_CACHE_SIZE = 1024             # per-worker memoize entries, 0 to disable
 
 RATE_LIMIT_BYPASS_KEY = "INSECURE_DEFAULT_CHANGE_ME"
 SECRET_KEY = "INSECURE_DEFAULT_CHANGE_ME"
@@ -222,7 +222,7 @@ def list_containers_db(tid):
     """
 
     db = api.db.get_conn()
-    return db.containers.find({"tid": tid})
+    return db.containers.find({"tid": tid}, {"_id": 0})
 
 def submission_to_cid(tid, pid):
     """
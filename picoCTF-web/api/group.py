@@ -153,6 +153,11 @@ def change_group_settings(gid, settings):
 
     db.groups.update({"gid": group["gid"]}, {"$set": {"settings": settings}})
 
+    # Hiding a group may hide its teams from the scoreboards
+    if settings["hidden"] != group["settings"]["hidden"]:
+        for tid in set(group["members"] + group["teachers"] + [group["owner"]]):
+            api.stats.update_team_scoreboards(tid)
+
 
 @log_action
 def join_group(gid, tid, teacher=False):
@@ -172,9 +177,11 @@ def join_group(gid, tid, teacher=False):
         uids = api.team.get_team_uids(tid=tid)
         for uid in uids:
             db.users.update({"uid": uid}, {"$set": {"teacher": True}})
+        cache.clear_request_memo()
 
     db.groups.update({"gid": gid}, {"$addToSet": {role_group: tid}})
     cache.invalidate(api.team.get_groups, tid)
+    api.stats.update_team_scoreboards(tid)
 
 
 @log_action
@@ -190,6 +197,8 @@ def leave_group(gid, tid):
     db.groups.update({"gid": gid}, {"$pull": {"teachers": tid}})
     db.groups.update({"gid": gid}, {"$pull": {"members": tid}})
     cache.invalidate(api.team.get_groups, tid)
+    api.stats.remove_team_from_group_scoreboard(gid, tid)
+    api.stats.update_team_scoreboards(tid)
 
 
 @log_action
@@ -205,6 +214,7 @@ def elevate_team(gid, tid):
     db.groups.update({"gid": gid}, {"$pull": {"members": tid}})
     db.groups.update({"gid": gid}, {"$addToSet": {"teachers": tid}})
     cache.invalidate(api.team.get_groups, tid)
+    api.stats.update_team_scoreboards(tid)
 
 
 @log_action
@@ -216,8 +226,16 @@ def delete_group(gid):
         gid: the group id to delete
     """
     db = api.db.get_conn()
+    group = get_group(gid=gid)
     db.groups.remove({"gid": gid})
 
+    # Drop the group's scoreboard and its pages, and re-evaluate scoreboard visibility
+    # for teams which may have been hidden by the group
+    cache.delete_scoreboard_cache(cache.get_scoreboard_cache(group_id=gid))
+    if group is not None:
+        for tid in set(group["members"] + group["teachers"] + [group["owner"]]):
+            api.stats.update_team_scoreboards(tid)
+
 
 def get_all_groups():
     """Return a list of all groups in the database."""
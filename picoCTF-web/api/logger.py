@@ -2,12 +2,15 @@
 import inspect
 import logging
 import logging.handlers
+import queue
+import threading
+import time
 import traceback
 from datetime import datetime
 from functools import wraps
 
 import pymongo
-from flask import has_request_context
+from flask import current_app, has_request_context
 from flask import logging as flask_logging
 from flask import request
 
@@ -21,19 +24,34 @@ class FunctionLoggingHandler(logging.StreamHandler):
     """
     Logs function invocations into the database.
 
-    Used by the @log_action decorator.
+    Used by the @log_action decorator. Records are assembled on the calling
+    thread and stored in batches by a background writer. Once the buffer is
+    full further records are dropped and counted in `dropped`.
     """
 
-    def __init__(self):
-        """Initialize the logger."""
+    def __init__(self, queue_size=10000, batch_size=100, flush_interval=1):
+        """
+        Initialize the logger.
+
+        Args:
+            queue_size: maximum number of buffered records
+            batch_size: number of records stored per insert
+            flush_interval: seconds a partial batch may wait before storing
+        """
         logging.StreamHandler.__init__(self)
+        self.records = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._db = None
+        self._writer = None
 
     def emit(self, record):
-        """Store record into the db."""
-        information = get_request_information()
+        """Queue record to be stored into the db."""
         result = record.msg
 
         if type(result) == dict:
+            information = get_request_information()
 
             information.update(
                 {
@@ -50,7 +68,67 @@ class FunctionLoggingHandler(logging.StreamHandler):
                 information["success"] = True
                 information["result"] = repr(result["result"])
 
-            api.db.get_conn().statistics.insert(information)
+            # The writer thread has no app context to look the db up with
+            if self._db is None:
+                self._db = api.db.get_conn()
+
+            try:
+                self.records.put_nowait(information)
+            except queue.Full:
+                self.dropped += 1
+                return
+
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        """Collect queued records into batches and store them."""
+        while True:
+            batch = [self.records.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.records.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._store(batch)
+
+    def _store(self, batch):
+        try:
+            self._db.statistics.insert_many(batch, ordered=False)
+        except Exception:
+            # Logging the failure would only recurse into the db again
+            self.dropped += len(batch)
+        finally:
+            for _ in batch:
+                self.records.task_done()
+
+    def flush(self, timeout=5):
+        """
+        Store all buffered records.
+
+        Called by logging.shutdown() at interpreter exit.
+
+        Args:
+            timeout: seconds to wait for a batch already held by the writer
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.records.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._store(batch)
+
+        with self.records.all_tasks_done:
+            self.records.all_tasks_done.wait_for(
+                lambda: not self.records.unfinished_tasks, timeout
+            )
 
 
 class ExceptionHandler(logging.StreamHandler):
@@ -135,7 +213,11 @@ def setup_logs(args):
     log.root.addHandler(internal_error_log)
 
     # Handle INFO level with FunctionLoggingHandler
-    stats_log = FunctionLoggingHandler()
+    stats_log = FunctionLoggingHandler(
+        queue_size=current_app.config.get("AUDIT_LOG_QUEUE_SIZE", 10000),
+        batch_size=current_app.config.get("AUDIT_LOG_BATCH_SIZE", 100),
+        flush_interval=current_app.config.get("AUDIT_LOG_FLUSH_INTERVAL", 1),
+    )
     stats_log.setLevel(logging.INFO)
     log.root.addHandler(stats_log)
 
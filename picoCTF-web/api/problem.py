@@ -205,6 +205,7 @@ def assign_instance_to_team(pid, tid=None, reassign=False):
 
     db = api.db.get_conn()
     db.teams.update({"tid": tid}, {"$set": team})
+    api.cache.clear_request_memo()
 
     return instance_number
 
@@ -258,6 +259,36 @@ def filter_problem_instances(problem, tid):
     return problem
 
 
+def filter_problems_instances(problems, tid):
+    """
+    Replace several problems' fields with those in a team's assigned instances.
+
+    Equivalent to calling filter_problem_instances on each problem, but
+    reuses the given problem dicts and looks up the team only once.
+
+    Args:
+        problems: list of problem dicts, including their instances
+        tid: the team id
+
+    Returns:
+        The list of filtered problem dicts
+
+    """
+    instance_map = api.team.get_team(tid=tid)["instances"]
+    for problem in problems:
+        iid = instance_map.get(problem["pid"])
+        instance = next(
+            (i for i in problem["instances"] if i["iid"] == iid and iid is not None),
+            None,
+        )
+        if instance is None:
+            # Not yet assigned, or assigned instance missing - (re)assign
+            instance = get_instance_data(problem["pid"], tid)
+        problem.pop("instances")
+        problem.update(instance)
+    return problems
+
+
 def get_problem(pid, projection=None):
     """
     Get a single problem.
@@ -308,7 +339,13 @@ def get_all_problems(category=None, show_disabled=False):
     )
 
 
-@memoize(timeout=3 * 24 * 60 * 60)
+@memoize(
+    timeout=3 * 24 * 60 * 60,
+    tags=("problems",),
+    depends_on=("tid", "uid"),
+    single_flight=True,
+    serializer="msgpack",
+)
 def get_solved_problems(tid=None, uid=None, category=None, show_disabled=False):
     """
     Get the solved problems for a given team or user.
@@ -326,45 +363,42 @@ def get_solved_problems(tid=None, uid=None, category=None, show_disabled=False):
     else:
         team = api.team.get_team(tid=tid)
 
-    members = api.team.get_team_uids(tid=team["tid"])
-
-    submissions = api.submissions.get_submissions(
-        tid=tid, uid=uid, category=category, correctness=True
-    )
+    # A user's solves are those of their team, as recorded in its ledger
+    db = api.db.get_conn()
+    pid_times = {
+        solve["pid"]: solve["solve_time"]
+        for solve in db.team_solves.find({"tid": team["tid"]}, {"_id": 0}).sort(
+            "solve_time", pymongo.ASCENDING
+        )
+    }
 
-    for uid in members:
-        submissions += api.submissions.get_submissions(
-            uid=uid, category=category, correctness=True
+    problem_match = {"pid": {"$in": list(pid_times.keys())}}
+    if category is not None:
+        problem_match.update({"category": category})
+    if not show_disabled:
+        problem_match.update({"disabled": False})
+    problems = {
+        problem["pid"]: problem
+        for problem in db.problems.find(
+            problem_match,
+            {
+                "_id": 0,
+                "pid": 1,
+                "unique_name": 1,
+                "score": 1,
+                "name": 1,
+                "disabled": 1,
+                "category": 1,
+            },
         )
+    }
 
-    pid_times = {}
     result = []
-
-    # Team submissions will take precedence because they appear first
-    # in the submissions list.
-    for submission in submissions:
-        pid = submission["pid"]
-        if pid not in pid_times:
-            problem = get_problem(
-                pid,
-                {
-                    "pid": 1,
-                    "unique_name": 1,
-                    "score": 1,
-                    "name": 1,
-                    "disabled": 1,
-                    "category": 1,
-                },
-            )
-            if problem is not None:
-                problem.update({"solved": True, "unlocked": True})
-                if not problem["disabled"] or show_disabled:
-                    result.append(problem)
-                pid_times[pid] = submission["timestamp"]
-        else:
-            pid_times[pid] = min(submission["timestamp"], pid_times.get(pid))
-    for p in result:
-        p["solve_time"] = pid_times[p["pid"]]
+    for pid, solve_time in pid_times.items():
+        if pid in problems:
+            problem = problems[pid]
+            problem.update({"solved": True, "unlocked": True, "solve_time": solve_time})
+            result.append(problem)
     return result
 
 
@@ -381,7 +415,7 @@ def get_solved_pids(*args, **kwargs):
     return [problem["pid"] for problem in get_solved_problems(*args, **kwargs)]
 
 
-def is_problem_unlocked(problem, solved):
+def is_problem_unlocked(problem, solved, graph=None):
     """
     Check whether the specified problem is unlocked.
 
@@ -392,24 +426,26 @@ def is_problem_unlocked(problem, solved):
 
     Args:
         problem: the problem object to check
-        solved: the list of solved problem objects
+        solved: the set of solved problem unique_names
+        graph: the unlock graph, looked up if not provided
     """
-    unlocked = True
+    if graph is None:
+        graph = api.bundles.get_unlock_graph()
 
-    for bundle in api.bundles.get_all_bundles():
-        if "dependencies" in bundle and bundle["dependencies_enabled"]:
-            if problem["unique_name"] in bundle["dependencies"]:
-                dependency = bundle["dependencies"][problem["unique_name"]]
-                weightsum = sum(
-                    dependency["weightmap"].get(p["unique_name"], 0) for p in solved
-                )
-                if weightsum < dependency["threshold"]:
-                    unlocked = False
-
-    return unlocked
+    for weightmap, threshold in graph.get(problem["unique_name"], []):
+        weightsum = sum(weight for name, weight in weightmap.items() if name in solved)
+        if weightsum < threshold:
+            return False
+    return True
 
 
-@memoize(timeout=3 * 24 * 60 * 60)
+@memoize(
+    timeout=3 * 24 * 60 * 60,
+    local_timeout=5,
+    tags=("problems", "bundles"),
+    depends_on=("tid",),
+    single_flight=True,
+)
 def get_unlocked_pids(tid):
     """
     Get the unlocked pids for a given team.
@@ -427,12 +463,16 @@ def get_unlocked_pids(tid):
     solved = get_solved_problems(tid=tid)
     team = api.team.get_team(tid)
 
-    unlocked = []
+    solved_names = {p["unique_name"] for p in solved}
+    graph = api.bundles.get_unlock_graph()
+
     db = api.db.get_conn()
-    all_problems = list(db.problems.find({}, {"unique_name": 1, "pid": 1}))
-    for problem in all_problems:
-        if is_problem_unlocked(problem, solved):
-            unlocked.append(problem["pid"])
+    all_problems = db.problems.find({}, {"unique_name": 1, "pid": 1})
+    unlocked = [
+        problem["pid"]
+        for problem in all_problems
+        if is_problem_unlocked(problem, solved_names, graph)
+    ]
 
     for pid in unlocked:
         if pid not in team["instances"]:
@@ -454,7 +494,8 @@ def load_published(data):
         for bundle in data["bundles"]:
             api.bundles.upsert_bundle(bundle)
 
-    api.cache.clear()
+    invalidate_problem_caches()
+    api.cache.invalidate_tags("bundles")
 
 
 def sanitize_problem_data(data):
@@ -511,6 +552,13 @@ def sanitize_problem_data(data):
     return data
 
 
+def invalidate_problem_caches():
+    """Drop cached values and scores derived from the problem set."""
+    api.cache.invalidate_tags("problems")
+    api.cache.get_score_cache().clear()
+    api.stats.reset_solve_matrix()
+
+
 def set_problem_availability(pid, disabled):
     """
     Update a problem's availability.
@@ -531,7 +579,7 @@ def set_problem_availability(pid, disabled):
     if not success:
         return None
     else:
-        api.cache.clear()
+        invalidate_problem_caches()
         return pid
 
 
@@ -568,3 +616,4 @@ def unlock_walkthrough(uid, pid, cost):
         {"uid": uid, "tokens": {"$gte": cost}, "unlocked_walkthroughs": {"$ne": pid}},
         {"$addToSet": {"unlocked_walkthroughs": pid}, "$inc": {"tokens": (cost * -1)}},
     )
+    api.cache.clear_request_memo()
@@ -57,6 +57,33 @@ def get_problem_feedback(pid=None, tid=None, uid=None, count_only=False):
         return list(db.problem_feedback.find(match, {"_id": 0}))
 
 
+def get_problem_feedback_counts():
+    """
+    Count the likes and dislikes for every problem in one aggregation.
+
+    Returns:
+        A dict of pid: {likes, dislikes} for problems with any feedback
+    """
+    db = api.db.get_conn()
+    counts = db.problem_feedback.aggregate(
+        [
+            {"$match": {"feedback.liked": {"$in": [True, False]}}},
+            {
+                "$group": {
+                    "_id": {"pid": "$pid", "liked": "$feedback.liked"},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+    )
+    result = {}
+    for count in counts:
+        pid_counts = result.setdefault(count["_id"]["pid"], {"likes": 0, "dislikes": 0})
+        key = "likes" if count["_id"]["liked"] else "dislikes"
+        pid_counts[key] = count["count"]
+    return result
+
+
 @log_action
 def upsert_feedback(pid, feedback):
     """
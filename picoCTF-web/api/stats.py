@@ -1,16 +1,30 @@
 """Module for calculating gameplay statistics."""
 
+import array
 import datetime
+import itertools
+import json
 import math
+import threading
+import time
 import pymongo
 
 import api
 from api.cache import (
     decode_scoreboard_item,
+    get_conn,
+    get_problem_solves_cache,
     get_score_cache,
     get_scoreboard_cache,
     get_scoreboard_key,
+    LocalCache,
     memoize,
+    replace_scoreboard_cache,
+    SCOREBOARD_ADDED_KEY,
+    SCOREBOARD_CHANGES_KEY,
+    SCOREBOARD_DIRTY_KEY,
+    SCOREBOARD_INCOMPLETE_KEY,
+    SCOREBOARD_PAGES_KEY,
     search_scoreboard_cache,
 )
 from api import PicoException
@@ -18,6 +32,144 @@ from api import PicoException
 
 SCOREBOARD_PAGE_LEN = 50
 
+# Seconds published pages are served after a change missing from them
+SCOREBOARD_MAX_STALENESS = 10
+# Most pages republished by a single change, beyond which the cache_stats
+# daemon's next full publish is left to catch up
+SCOREBOARD_UPDATE_PAGES = 4
+# Sets or removes (when the score is empty) a scoreboard entry, returning the
+# change number and the range of pages it moved entries on. New entries are
+# recorded for the search indexes built before them.
+SCOREBOARD_UPDATE_SCRIPT = """
+local old = redis.call("zrevrank", KEYS[1], ARGV[1])
+local changed
+if ARGV[2] == "" then
+    changed = redis.call("zrem", KEYS[1], ARGV[1])
+else
+    changed = redis.call("zadd", KEYS[1], "CH", ARGV[2], ARGV[1])
+end
+if changed == 0 then
+    return false
+end
+local new = redis.call("zrevrank", KEYS[1], ARGV[1])
+local change = redis.call("incr", KEYS[2])
+redis.call("set", KEYS[3], ARGV[3], "NX")
+if not old then
+    redis.call("zadd", KEYS[5], ARGV[3], ARGV[1])
+    redis.call("zremrangebyscore", KEYS[5], "-inf", ARGV[6])
+end
+local first, last
+if not old then
+    first, last = new, redis.call("zcard", KEYS[1]) - 1
+elseif not new then
+    first, last = old, redis.call("zcard", KEYS[1])
+else
+    first, last = math.min(old, new), math.max(old, new)
+end
+local page_len = tonumber(ARGV[4])
+first = math.floor(first / page_len) + 1
+last = math.floor(last / page_len) + 1
+if last - first >= tonumber(ARGV[5]) then
+    redis.call("set", KEYS[4], change)
+    return {change, 0, 0}
+end
+return {change, first, last}
+"""
+# Writes pages rendered at a change number, unless newer ones were written
+SCOREBOARD_WRITE_SCRIPT = """
+local version = tonumber(ARGV[1])
+local full = ARGV[2] == "1"
+if not full and redis.call("exists", KEYS[1]) == 0 then
+    return 0
+end
+local function current(field)
+    local written = redis.call("hget", KEYS[1], "version:" .. field)
+    return not written or tonumber(written) <= version
+end
+local total = tonumber(ARGV[3])
+if current("total") then
+    redis.call("hmset", KEYS[1], "total_pages", total, "version:total", version)
+    if full then
+        for _, field in ipairs(redis.call("hkeys", KEYS[1])) do
+            local page = tonumber(string.match(field, "^page:(%d+)$"))
+            if page and page > total and current(page) then
+                redis.call("hdel", KEYS[1], field, "version:" .. page)
+            end
+        end
+    end
+end
+for i = 4, #ARGV, 2 do
+    if current(ARGV[i]) then
+        redis.call(
+            "hmset", KEYS[1],
+            "page:" .. ARGV[i], ARGV[i + 1], "version:" .. ARGV[i], version
+        )
+    end
+end
+local incomplete = redis.call("get", KEYS[4])
+if full and incomplete and tonumber(incomplete) <= version then
+    redis.call("del", KEYS[4])
+    incomplete = false
+end
+if not incomplete and tonumber(redis.call("get", KEYS[2]) or 0) == version then
+    redis.call("del", KEYS[3])
+end
+return 1
+"""
+__scoreboard_update_script = None
+__scoreboard_write_script = None
+
+# Users fetched, and scored, at a time by bulk exports
+EXPORT_BATCH_SIZE = 1000
+
+DEMOGRAPHIC_FIELDS = ["usertype", "country", "gender", "zipcode", "grade", "score"]
+
+# Field of the solve counts hash, so that it exists even without problems
+PROBLEM_SOLVES_SENTINEL = "_reconciled"
+
+# Search indexes of scoreboards, built in each worker as needed. Entries
+# added since an index was built are read from SCOREBOARD_ADDED_KEY, and
+# stale indexes are served while a single thread rebuilds them.
+SEARCH_INDEX_TIMEOUT = 60 * 60
+SEARCH_INDEX_REBUILD_INTERVAL = 60
+# Allowance for the clocks of the workers recording added entries
+SEARCH_INDEX_CLOCK_SKEW = 60
+__search_indexes = LocalCache(64)
+__search_index_builds = set()
+__search_index_lock = threading.Lock()
+
+# Per-worker solve matrix, checked for new solves at most this often
+SOLVE_MATRIX_REFRESH_INTERVAL = 1
+# Solves recorded in the ledger, scored by a solve sequence number, so that
+# workers read each one once. Workers further behind rebuild their matrix.
+SOLVE_MATRIX_SOLVES_KEY = "solve_matrix:solves"
+SOLVE_MATRIX_SOLVE_SEQUENCE_KEY = "solve_matrix:solve_sequence"
+SOLVE_MATRIX_SOLVES_TRIMMED_KEY = "solve_matrix:solves_trimmed"
+SOLVE_MATRIX_SOLVES_LEN = 10000
+SOLVE_MATRIX_SOLVE_SCRIPT = """
+local solve = redis.call("incr", KEYS[1])
+redis.call("zadd", KEYS[2], solve, ARGV[1])
+local trimmed = solve - tonumber(ARGV[2])
+if trimmed > 0 then
+    redis.call("zremrangebyscore", KEYS[2], "-inf", trimmed)
+    redis.call("set", KEYS[3], trimmed)
+end
+return solve
+"""
+# Bumped whenever the problem set changes, or every team's solves are cleared
+SOLVE_MATRIX_GENERATION_KEY = "solve_matrix:generation"
+# Teams whose solves were rebuilt or removed, scored by a change sequence number
+SOLVE_MATRIX_TEAM_CHANGES_KEY = "solve_matrix:team_changes"
+SOLVE_MATRIX_TEAM_CHANGE_SEQUENCE_KEY = "solve_matrix:team_change_sequence"
+SOLVE_MATRIX_TEAM_CHANGE_SCRIPT = """
+local change = redis.call("incr", KEYS[1])
+redis.call("zadd", KEYS[2], change, ARGV[1])
+return change
+"""
+__solve_matrix = None
+__team_change_script = None
+__solve_script = None
+
 
 def _get_problem_names(problems):
     """Extract the names from a list of problems."""
@@ -105,7 +257,6 @@ def get_group_scores(gid=None, name=None):
     """
     key_args = {"group_id": gid}
     scoreboard_cache = get_scoreboard_cache(**key_args)
-    scoreboard_cache.clear()
 
     member_teams = [
         api.team.get_team(tid=tid) for tid in api.group.get_group(gid=gid)["members"]
@@ -117,8 +268,7 @@ def get_group_scores(gid=None, name=None):
             score = get_score(tid=team["tid"])
             key = get_scoreboard_key(team)
             result[key] = score
-    if result:
-        scoreboard_cache.add(result)
+    replace_scoreboard_cache(scoreboard_cache, result)
 
     return scoreboard_cache
 
@@ -139,13 +289,36 @@ def get_group_average_score(gid=None, name=None):
     return int(total_score / len(group_scores)) if len(group_scores) > 0 else 0
 
 
+def get_hidden_tids():
+    """
+    Get the teams which are exclusively members of hidden groups.
+
+    Builds a team -> group visibility index in a single pass over the groups,
+    rather than scanning every group's membership lists for each team.
+
+    Returns:
+        A set of tids which should not appear on the scoreboards
+
+    """
+    has_hidden_group = set()
+    has_visible_group = set()
+    for group in api.group.get_all_groups():
+        tids = has_hidden_group if group["settings"]["hidden"] else has_visible_group
+        tids.update(group["members"])
+        tids.update(group["teachers"])
+        tids.add(group["owner"])
+    return has_hidden_group - has_visible_group
+
+
 # Stored by the cache_stats daemon
-def get_all_team_scores(scoreboard_id=None):
+def get_all_team_scores(scoreboard_id=None, hidden_tids=None):
     """
     Get the score for every team in the database.
 
     Args:
         scoreboard_id: Optional, limit to teams eligible for this scoreboard
+        hidden_tids: Optional, precomputed result of get_hidden_tids(), so
+                     that it can be shared when rebuilding several scoreboards
 
     Returns:
         A list of dictionaries with name and score
@@ -155,56 +328,186 @@ def get_all_team_scores(scoreboard_id=None):
     teams = api.team.get_all_teams(**key_args)
     scoreboard_cache = get_scoreboard_cache(**key_args)
 
+    if hidden_tids is None:
+        hidden_tids = get_hidden_tids()
+
     result = {}
-    all_groups = api.group.get_all_groups()
     for team in teams:
-        # Get the full version of the group.
-        groups = [
-            group
-            for group in all_groups
-            if team["tid"] in group["members"]
-            or team["tid"] in group["teachers"]
-            or team["tid"] == group["owner"]
-        ]
-
-        # Determine if the user is exclusively a member of hidden groups.
-        # If they are, they won't be processed.
-        if len(groups) == 0 or any(
-            [not (group["settings"]["hidden"]) for group in groups]
-        ):
+        # Teams which are exclusively members of hidden groups are skipped.
+        if team["tid"] not in hidden_tids:
             score = get_score(tid=team["tid"])
             if score > 0:
                 key = get_scoreboard_key(team=team)
                 result[key] = score
-    scoreboard_cache.clear()
-    if result:
-        scoreboard_cache.add(result)
+    replace_scoreboard_cache(scoreboard_cache, result)
     return scoreboard_cache
 
 
-def get_all_user_scores():
+def update_team_scoreboards(tid, removed=False):
     """
-    Get the score for every user in the database.
+    Update a team's entries on every scoreboard and group scoreboard.
 
-    Returns:
-        A list of dictionaries with name and score
+    Called whenever a team's score, size, or group membership changes, so
+    that the scoreboards stay current between runs of the cache_stats daemon.
+    The daemon's full rebuilds then only serve to reconcile any drift.
 
+    Args:
+        tid: the team id
+        removed: drop the team from every scoreboard, e.g. before deletion
     """
-    users = api.user.get_all_users()
+    team = api.team.get_team(tid=tid)
+    if team is None:
+        return
 
-    result = []
-    for user in users:
-        result.append(
-            {
-                "name": user["username"],
-                "score": get_score(uid=user["uid"], time_weighted=False),
-            }
+    db = api.db.get_conn()
+    groups = list(
+        db.groups.find(
+            {"$or": [{"owner": tid}, {"teachers": tid}, {"members": tid}]},
+            {"_id": 0, "gid": 1, "members": 1, "settings": 1},
+        )
+    )
+
+    key = get_scoreboard_key(team)
+    active = team["size"] > 0 and not removed
+    score = get_score(tid=tid) if active else 0
+
+    # Mirror the eligibility rules used by get_all_team_scores
+    visible = active and (
+        len(groups) == 0 or any([not group["settings"]["hidden"] for group in groups])
+    )
+    scoreboard_ids = [
+        scoreboard["sid"] for scoreboard in api.scoreboards.get_all_scoreboards()
+    ]
+
+    updates = []
+    for sid in scoreboard_ids:
+        scoreboard = get_scoreboard_cache(scoreboard_id=sid)
+        eligible = sid in team.get("eligibilities", [])
+        if visible and eligible and score > 0:
+            updates.append((scoreboard.key, key, score))
+        else:
+            updates.append((scoreboard.key, key, None))
+
+    # Mirror the membership rules used by get_group_scores
+    for group in groups:
+        scoreboard = get_scoreboard_cache(group_id=group["gid"])
+        if active and tid in group["members"]:
+            updates.append((scoreboard.key, key, score))
+        else:
+            updates.append((scoreboard.key, key, None))
+    _update_scoreboards(updates)
+
+
+def remove_team_from_group_scoreboard(gid, tid):
+    """
+    Remove a team's entry from a group scoreboard.
+
+    Args:
+        gid: the group id
+        tid: the team id
+    """
+    team = api.team.get_team(tid=tid)
+    if team is not None:
+        scoreboard = get_scoreboard_cache(group_id=gid)
+        _update_scoreboards([(scoreboard.key, get_scoreboard_key(team), None)])
+
+
+def _update_scoreboards(updates):
+    """
+    Set or remove entries on scoreboards, and republish the affected pages.
+
+    Changes which move entries across more than SCOREBOARD_UPDATE_PAGES
+    pages leave them to the next full publish by the cache_stats daemon.
+
+    Args:
+        updates: list of (scoreboard key, entry, score or None to remove it)
+    """
+    global __scoreboard_update_script
+    conn = get_conn()
+    if __scoreboard_update_script is None:
+        __scoreboard_update_script = conn.register_script(SCOREBOARD_UPDATE_SCRIPT)
+
+    now = time.time()
+    pipe = conn.pipeline(transaction=False)
+    for board_key, entry, score in updates:
+        __scoreboard_update_script(
+            keys=[
+                board_key,
+                SCOREBOARD_CHANGES_KEY % board_key,
+                SCOREBOARD_DIRTY_KEY % board_key,
+                SCOREBOARD_INCOMPLETE_KEY % board_key,
+                SCOREBOARD_ADDED_KEY % board_key,
+            ],
+            args=[
+                entry,
+                "" if score is None else score,
+                now,
+                SCOREBOARD_PAGE_LEN,
+                SCOREBOARD_UPDATE_PAGES,
+                now - SEARCH_INDEX_TIMEOUT - SEARCH_INDEX_CLOCK_SKEW,
+            ],
+            client=pipe,
         )
+    for (board_key, _, _), result in zip(updates, pipe.execute()):
+        if result and result[1] > 0:
+            _republish_scoreboard_pages(board_key, result[1], result[2])
 
-    return sorted(result, key=lambda item: item["score"], reverse=True)
 
+def _get_team_scores(tids, problem_scores):
+    """
+    Sum the scores of several teams with a single query.
 
-@memoize(timeout=120)
+    Args:
+        tids: the team ids
+        problem_scores: dict of pid: score for the enabled problems
+    Returns:
+        A dict of tid: int score, as get_score(tid=...) would give
+    """
+    db = api.db.get_conn()
+    scores = dict.fromkeys(tids, 0)
+    for solves in db.team_solves.aggregate(
+        [
+            {"$match": {"tid": {"$in": list(tids)}}},
+            {"$group": {"_id": "$tid", "pids": {"$push": "$pid"}}},
+        ]
+    ):
+        scores[solves["_id"]] = sum(
+            problem_scores.get(pid, 0) for pid in solves["pids"]
+        )
+    return scores
+
+
+def _iter_scored_users(projection, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Iterate over every user along with their score.
+
+    Users are read through a batched cursor and scored a batch at a time,
+    so memory use does not grow with the number of users.
+
+    Args:
+        projection: user fields to include
+        batch_size: users to fetch and score at a time
+    Returns:
+        generator of (user, int score)
+    """
+    db = api.db.get_conn()
+    problem_scores = {
+        problem["pid"]: problem["score"]
+        for problem in db.problems.find(
+            {"disabled": False}, {"_id": 0, "pid": 1, "score": 1}
+        )
+    }
+    cursor = db.users.find({}, dict(projection, _id=0, tid=1)).batch_size(batch_size)
+    while True:
+        batch = list(itertools.islice(cursor, batch_size))
+        if not batch:
+            return
+        scores = _get_team_scores({user["tid"] for user in batch}, problem_scores)
+        for user in batch:
+            yield user, scores[user["tid"]]
+
+
+@memoize(timeout=120, local_timeout=10, tags=("problems",), stale_timeout=60)
 def get_problems_by_category():
     """
     Get the list of all problems divided into categories.
@@ -234,31 +537,46 @@ def get_team_member_stats(tid):
     """
     members = api.team.get_team_members(tid=tid)
 
-    return {
-        member["username"]: _get_problem_names(
-            api.problem.get_solved_problems(uid=member["uid"])
-        )
-        for member in members
-    }
+    # A user's solves are those of their team, as recorded in its ledger
+    solved = _get_problem_names(api.problem.get_solved_problems(tid=tid))
+    return {member["username"]: list(solved) for member in members}
 
 
-def get_problem_submission_stats(pid=None):
+def get_all_problem_submission_stats():
     """
-    Retrieve the number of valid and invalid submissions for a given problem.
+    Retrieve the number of valid and invalid submissions for every problem.
 
-    Args:
-        pid: the pid of the problem
-        name: the name of the problem
     Returns:
-        Dict of {valid: #, invalid: #}
+        Dict of {pid: {valid: #, invalid: #}}
     """
-    return {
-        "valid": len(api.submissions.get_submissions(pid, correctness=True)),
-        "invalid": len(api.submissions.get_submissions(pid, correctness=False)),
+    db = api.db.get_conn()
+    stats = {
+        problem["pid"]: {"valid": 0, "invalid": 0}
+        for problem in db.problems.find({}, {"_id": 0, "pid": 1})
     }
+    for count in db.submissions.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {"pid": "$pid", "correct": "$correct"},
+                    "count": {"$sum": 1},
+                }
+            }
+        ]
+    ):
+        if count["_id"]["pid"] in stats:
+            field = "valid" if count["_id"]["correct"] else "invalid"
+            stats[count["_id"]["pid"]][field] = count["count"]
+    return stats
 
 
-@memoize(timeout=3 * 24 * 60 * 60)
+@memoize(
+    timeout=3 * 24 * 60 * 60,
+    tags=("problems",),
+    depends_on=("tid", "uid"),
+    single_flight=True,
+    serializer="msgpack",
+)
 def get_score_progression(tid=None, uid=None, category=None):
     """
     Find the score and time after each correct submission of a team or user.
@@ -296,8 +614,78 @@ def get_score_progression(tid=None, uid=None, category=None):
     return result
 
 
-# Stored by the cache_stats daemon
-@memoize
+def get_score_progressions(tids):
+    """
+    Find the score progressions of several teams at once.
+
+    Equivalent to calling get_score_progression(tid=tid) for each team, but
+    reads the first solves of every team in a single aggregation.
+
+    Args:
+        tids: the team ids
+    Returns:
+        A dict of tid: list of dictionaries containing score and time
+    """
+    db = api.db.get_conn()
+    problem_scores = {
+        problem["pid"]: problem["score"]
+        for problem in db.problems.find(
+            {"disabled": False}, {"_id": 0, "pid": 1, "score": 1}
+        )
+    }
+    progressions = {tid: [] for tid in tids}
+    for solves in db.team_solves.aggregate(
+        [
+            {"$match": {"tid": {"$in": list(tids)}}},
+            {"$sort": {"solve_time": pymongo.ASCENDING}},
+            {
+                "$group": {
+                    "_id": "$tid",
+                    "solves": {"$push": {"pid": "$pid", "time": "$solve_time"}},
+                }
+            },
+        ]
+    ):
+        counted = [s for s in solves["solves"] if s["pid"] in problem_scores]
+        scores = itertools.accumulate(problem_scores[s["pid"]] for s in counted)
+        progressions[solves["_id"]] = [
+            {"score": score, "time": int(solve["time"].timestamp())}
+            for score, solve in zip(scores, counted)
+        ]
+    return progressions
+
+
+def downsample_score_progressions(progressions, points=None):
+    """
+    Downsample the score progressions of several teams.
+
+    Applied to the cached, full progressions, so that callers can ask for
+    any number of points without each number being cached separately.
+
+    Args:
+        progressions: list of dicts with each team's score_progression, as
+                      returned by get_top_teams_score_progressions()
+        points: if specified, the most entries to keep in each progression.
+                The final score is always kept.
+    Returns:
+        the downsampled progressions
+    """
+    if points is None:
+        return progressions
+    if points < 1:
+        raise PicoException("Progressions must have at least one point.", 400)
+
+    result = []
+    for team in progressions:
+        progression = team["score_progression"]
+        if len(progression) > points:
+            step = (len(progression) - 1) / max(points - 1, 1)
+            kept = [round(i * step) for i in range(points - 1)]
+            progression = [progression[i] for i in kept] + [progression[-1]]
+        result.append(dict(team, score_progression=progression))
+    return result
+
+
 def get_problem_solves(pid):
     """
     Return the number of solves for a particular problem.
@@ -305,13 +693,66 @@ def get_problem_solves(pid):
     Args:
         pid: pid of the problem
     """
+    return get_problem_solves_many([pid])[pid]
+
+
+def get_problem_solves_many(pids):
+    """
+    Return the number of solves for several problems at once.
+
+    Counts are read from a single hash which submit_key keeps current,
+    and which is rebuilt if missing.
+
+    Args:
+        pids: list of problem pids
+    Returns:
+        A dict of pid: solves
+    """
+    solves_cache = get_problem_solves_cache()
+    solves = solves_cache.as_dict(decode=True)
+    if not solves:
+        solves = reconcile_problem_solves()
+    return {pid: int(solves.get(pid, 0)) for pid in pids}
+
+
+# Stored by the cache_stats daemon
+def reconcile_problem_solves():
+    """
+    Recount the solves for every problem and replace the solve count hash.
+
+    Solves counted by submit_key between the recount and the replacement
+    are lost, until the next run of the cache_stats daemon recounts them.
+
+    Returns:
+        A dict of pid: solves
+    """
     db = api.db.get_conn()
+    solves = {
+        problem["pid"]: 0
+        for problem in api.problem.get_all_problems(show_disabled=True)
+    }
+    for count in db.submissions.aggregate(
+        [
+            {"$match": {"correct": True}},
+            {"$group": {"_id": "$pid", "count": {"$sum": 1}}},
+        ]
+    ):
+        solves[count["_id"]] = count["count"]
 
-    return db.submissions.count({"pid": pid, "correct": True})
+    # Swap in the new counts atomically so that readers never see
+    # a missing or partial hash
+    solves_cache = get_problem_solves_cache()
+    staging_key = "{}:staging".format(solves_cache.key)
+    pipe = get_conn().pipeline()
+    pipe.delete(staging_key)
+    pipe.hmset(staging_key, dict(solves, **{PROBLEM_SOLVES_SENTINEL: 1}))
+    pipe.rename(staging_key, solves_cache.key)
+    pipe.execute()
+    return solves
 
 
 # Stored by the cache_stats daemon
-@memoize
+@memoize(tags=("problems",), stale_timeout=60, serializer="msgpack")
 def get_top_teams_score_progressions(limit=5, scoreboard_id=None, group_id=None):
     """
     Get the score progressions for the top teams.
@@ -328,22 +769,28 @@ def get_top_teams_score_progressions(limit=5, scoreboard_id=None, group_id=None)
         A dict containing each team's name, affiliation, and score progression.
 
     """
-
-    def output_item(item):
-        data = decode_scoreboard_item(item)
-        return {
-            "name": data["name"],
-            "affiliation": data["affiliation"],
-            "score_progression": get_score_progression(tid=data["tid"]),
-        }
-
+    # The scoreboards are kept current by solves, so are only built if missing,
+    # as rebuilding one leaves its published pages to the next full publish
     if group_id is None:
-        scoreboard_cache = get_all_team_scores(scoreboard_id=scoreboard_id)
+        scoreboard_cache = get_scoreboard_cache(scoreboard_id=scoreboard_id)
+        if len(scoreboard_cache) == 0:
+            scoreboard_cache = get_all_team_scores(scoreboard_id=scoreboard_id)
     else:
-        scoreboard_cache = get_group_scores(gid=group_id)
+        scoreboard_cache = get_scoreboard_cache(group_id=group_id)
+        if len(scoreboard_cache) == 0:
+            scoreboard_cache = get_group_scores(gid=group_id)
 
     team_items = scoreboard_cache.range(0, limit - 1, with_scores=True, desc=True)
-    return [output_item(team_item) for team_item in team_items]
+    teams = [decode_scoreboard_item(item) for item in team_items]
+    progressions = get_score_progressions([team["tid"] for team in teams])
+    return [
+        {
+            "name": team["name"],
+            "affiliation": team["affiliation"],
+            "score_progression": progressions[team["tid"]],
+        }
+        for team in teams
+    ]
 
 
 # Stored by the cache_stats daemon.
@@ -358,17 +805,41 @@ def get_registration_count():
         "groups": db.groups.count(),
         "teachers": db.users.count({"usertype": "teacher"}),
     }
-    usernames = set(db.users.distinct("username"))
-    team_names = set(db.teams.distinct("team_name"))
-
-    real_team_names = team_names - usernames
-    real_team_ids = [
-        t["tid"]
-        for t in list(db.teams.find({"team_name": {"$in": list(real_team_names)}}))
-    ]
 
-    teamed_users = db.users.count({"tid": {"$in": real_team_ids}})
-    stats["teamed_users"] = teamed_users
+    # Every user registers with a team named after them; any team that does
+    # not share its name with a user is a "real" team. Count their members
+    # server-side so that memory use does not grow with registrations.
+    teamed_users = list(
+        db.teams.aggregate(
+            [
+                {"$project": {"_id": 0, "tid": 1, "team_name": 1}},
+                {
+                    "$lookup": {
+                        "from": "users",
+                        "localField": "team_name",
+                        "foreignField": "username",
+                        "as": "namesake",
+                    }
+                },
+                {"$match": {"namesake": {"$size": 0}}},
+                {
+                    "$lookup": {
+                        "from": "users",
+                        "localField": "tid",
+                        "foreignField": "tid",
+                        "as": "members",
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": None,
+                        "teamed_users": {"$sum": {"$size": "$members"}},
+                    }
+                },
+            ]
+        )
+    )
+    stats["teamed_users"] = teamed_users[0]["teamed_users"] if teamed_users else 0
 
     return stats
 
@@ -392,15 +863,7 @@ def get_scoreboard_page(scoreboard_key, page_number=None):
     """
     board_cache = get_scoreboard_cache(**scoreboard_key)
     if not page_number:
-        try:
-            user = api.user.get_user()
-            team = api.team.get_team(tid=user["tid"])
-            team_position = (
-                board_cache.rank(get_scoreboard_key(team), reverse=True) or 0
-            )
-            page_number = math.floor(team_position / SCOREBOARD_PAGE_LEN) + 1
-        except PicoException:
-            page_number = 1
+        page_number = _get_current_team_page(board_cache)
     start = SCOREBOARD_PAGE_LEN * (page_number - 1)
     end = start + SCOREBOARD_PAGE_LEN - 1
     board_page = [
@@ -412,12 +875,236 @@ def get_scoreboard_page(scoreboard_key, page_number=None):
     return board_page, page_number, available_pages
 
 
+def _get_current_team_page(board_cache):
+    """Find the page of a live scoreboard containing the current team."""
+    try:
+        user = api.user.get_user()
+        team = api.team.get_team(tid=user["tid"])
+        team_position = board_cache.rank(get_scoreboard_key(team), reverse=True) or 0
+        return math.floor(team_position / SCOREBOARD_PAGE_LEN) + 1
+    except PicoException:
+        return 1
+
+
+def _render_scoreboard_pages(items, first, last):
+    """Render a range of pages to JSON, from the entries starting the first."""
+    pages = []
+    for page_number in range(first, last + 1):
+        start = (page_number - first) * SCOREBOARD_PAGE_LEN
+        board_page = [
+            decode_scoreboard_item(item)
+            for item in items[start : start + SCOREBOARD_PAGE_LEN]
+        ]
+        pages.extend([page_number, json.dumps(board_page)])
+    return pages
+
+
+def _write_scoreboard_pages(board_key, version, size, pages, full=False):
+    """
+    Write rendered pages to a scoreboard's published pages.
+
+    Args:
+        board_key: key of the scoreboard
+        version: the scoreboard's change count when the pages were read
+        size: the number of entries on the scoreboard at the time
+        pages: list of alternating page numbers and page JSON
+        full: whether every page was rendered, so that the pages past the
+              end of the scoreboard are dropped
+    """
+    global __scoreboard_write_script
+    conn = get_conn()
+    if __scoreboard_write_script is None:
+        __scoreboard_write_script = conn.register_script(SCOREBOARD_WRITE_SCRIPT)
+    __scoreboard_write_script(
+        keys=[
+            SCOREBOARD_PAGES_KEY % board_key,
+            SCOREBOARD_CHANGES_KEY % board_key,
+            SCOREBOARD_DIRTY_KEY % board_key,
+            SCOREBOARD_INCOMPLETE_KEY % board_key,
+        ],
+        args=[
+            version,
+            int(full),
+            max(math.ceil(size / SCOREBOARD_PAGE_LEN), 1),
+        ]
+        + pages,
+    )
+
+
+def _republish_scoreboard_pages(board_key, first, last):
+    """Rewrite a range of a scoreboard's published pages, if it has any."""
+    pipe = get_conn().pipeline()
+    pipe.get(SCOREBOARD_CHANGES_KEY % board_key)
+    pipe.zrevrange(
+        board_key,
+        SCOREBOARD_PAGE_LEN * (first - 1),
+        SCOREBOARD_PAGE_LEN * last - 1,
+        withscores=True,
+    )
+    pipe.zcard(board_key)
+    version, items, size = pipe.execute()
+    pages = _render_scoreboard_pages(items, first, last)
+    _write_scoreboard_pages(board_key, int(version or 0), size, pages)
+
+
+# Stored by the cache_stats daemon
+def publish_scoreboard_pages(scoreboard_key):
+    """
+    Render every page of a scoreboard to JSON and publish them.
+
+    Pages are written along with the scoreboard's change count when they
+    were read, and never over pages rendered after a later change.
+
+    Args:
+        scoreboard_key (dict): scoreboard key
+    """
+    board_key = get_scoreboard_cache(**scoreboard_key).key
+    pipe = get_conn().pipeline()
+    pipe.get(SCOREBOARD_CHANGES_KEY % board_key)
+    pipe.zrevrange(board_key, 0, -1, withscores=True)
+    version, items = pipe.execute()
+    total_pages = max(math.ceil(len(items) / SCOREBOARD_PAGE_LEN), 1)
+    pages = _render_scoreboard_pages(items, 1, total_pages)
+    _write_scoreboard_pages(board_key, int(version or 0), len(items), pages, True)
+
+
+def get_scoreboard_page_json(scoreboard_key, page_number=None):
+    """
+    Get a scoreboard page as a JSON response body.
+
+    Pages are served as published, and kept current by the solves which
+    change them. Pages left more than SCOREBOARD_MAX_STALENESS seconds
+    behind the scoreboard are rendered from the live scoreboard instead.
+
+    Args:
+        scoreboard_key (dict): scoreboard key
+
+    Kwargs:
+        page_number (int): page to retrieve, defaults to None (which attempts
+                     to return the current team's page)
+
+    Returns:
+        JSON object string with scoreboard, current_page and total_pages
+    """
+    board_cache = get_scoreboard_cache(**scoreboard_key)
+    current_page = page_number or _get_current_team_page(board_cache)
+
+    pipe = get_conn().pipeline(transaction=False)
+    pipe.hmget(
+        SCOREBOARD_PAGES_KEY % board_cache.key,
+        "page:{}".format(current_page),
+        "total_pages",
+    )
+    pipe.get(SCOREBOARD_DIRTY_KEY % board_cache.key)
+    (board_page, total_pages), dirty = pipe.execute()
+
+    stale = (
+        total_pages is None
+        or (dirty is not None and time.time() - float(dirty) > SCOREBOARD_MAX_STALENESS)
+        or (board_page is None and current_page <= int(total_pages))
+    )
+    if stale:
+        board_page, current_page, total_pages = get_scoreboard_page(
+            scoreboard_key, current_page
+        )
+        board_page = json.dumps(board_page)
+    else:
+        board_page = board_page.decode() if board_page is not None else "[]"
+
+    return '{{"scoreboard": {}, "current_page": {}, "total_pages": {}}}'.format(
+        board_page, int(current_page), int(total_pages)
+    )
+
+
+class ScoreboardSearchIndex(object):
+    """Trigram index over the team names and affiliations on a scoreboard."""
+
+    def __init__(self, built, entries):
+        """
+        Index a scoreboard.
+
+        Args:
+            built: the time the entries were read
+            entries: the scoreboard ZSet's members
+        """
+        self.built = built
+        self.entries = entries
+        self.texts = [_get_search_text(entry) for entry in entries]
+        self.postings = {}
+        for position, text in enumerate(self.texts):
+            for gram in self._trigrams(text):
+                self.postings.setdefault(gram, []).append(position)
+
+    @staticmethod
+    def _trigrams(text):
+        text = text.lower()
+        return {text[i : i + 3] for i in range(len(text) - 2)}
+
+    def search(self, pattern):
+        """
+        Find the entries containing a pattern.
+
+        Args:
+            pattern: text to find in the team name or affiliation
+        Returns:
+            the matching ZSet members
+        """
+        grams = self._trigrams(pattern)
+        if grams:
+            postings = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            candidates = range(len(self.texts))
+        return [
+            self.entries[position]
+            for position in candidates
+            if pattern in self.texts[position]
+        ]
+
+
+def _get_search_text(entry):
+    """Get the searched part, name>affiliation, of a scoreboard ZSet member."""
+    return entry.decode("utf-8").rsplit(">", 1)[0]
+
+
+def _get_search_index(board_key):
+    """
+    Get this worker's search index for a scoreboard.
+
+    Indexes older than SEARCH_INDEX_REBUILD_INTERVAL are rebuilt by the first
+    thread to find them, while the other threads keep serving them.
+
+    Returns:
+        the ScoreboardSearchIndex, or None while the first one is being built
+    """
+    hit, index = __search_indexes.get(board_key)
+    if hit and time.time() - index.built < SEARCH_INDEX_REBUILD_INTERVAL:
+        return index
+
+    with __search_index_lock:
+        building = board_key in __search_index_builds
+        __search_index_builds.add(board_key)
+    if building:
+        return index
+    try:
+        cache_generation = __search_indexes.generation
+        built = time.time()
+        index = ScoreboardSearchIndex(built, get_conn().zrange(board_key, 0, -1))
+        __search_indexes.set(board_key, index, SEARCH_INDEX_TIMEOUT, cache_generation)
+        return index
+    finally:
+        with __search_index_lock:
+            __search_index_builds.discard(board_key)
+
+
 def get_filtered_scoreboard_page(scoreboard_key, pattern, page_number=1):
     """
     Get a page of a filtered scoreboard.
 
     Scoreboards can be filtered by a search pattern on the team name and
-    affiliation fields.
+    affiliation fields. Scoreboards are searched with an index of their
+    entries, along with the entries added since it was built, and scanned
+    while a worker builds its first index.
 
     If a page is not specified, will fall back to the first page.
 
@@ -431,10 +1118,48 @@ def get_filtered_scoreboard_page(scoreboard_key, pattern, page_number=1):
     Returns:
         (list: scoreboard page, int: current page, int: number of pages)
     """
-    board_cache = get_scoreboard_cache(**scoreboard_key)
-    results = search_scoreboard_cache(board_cache, pattern)
     start = SCOREBOARD_PAGE_LEN * (page_number - 1)
     end = start + SCOREBOARD_PAGE_LEN
+    board_cache = get_scoreboard_cache(**scoreboard_key)
+    conn = get_conn()
+
+    index = _get_search_index(board_cache.key)
+    if index is not None:
+        added = conn.zrangebyscore(
+            SCOREBOARD_ADDED_KEY % board_cache.key,
+            index.built - SEARCH_INDEX_CLOCK_SKEW,
+            "+inf",
+        )
+        matches = set(index.search(pattern))
+        matches.update(entry for entry in added if pattern in _get_search_text(entry))
+        matches = list(matches)
+
+        # Score the matches, dropping entries removed since they were indexed
+        pipe = conn.pipeline(transaction=False)
+        for entry in matches:
+            pipe.zscore(board_cache.key, entry)
+        results = sorted(
+            [
+                (score, entry)
+                for entry, score in zip(matches, pipe.execute())
+                if score is not None
+            ],
+            reverse=True,
+        )
+
+        pipe = conn.pipeline(transaction=False)
+        for _, entry in results[start:end]:
+            pipe.zrevrank(board_cache.key, entry)
+        board_page = []
+        for (score, entry), rank in zip(results[start:end], pipe.execute()):
+            if rank is not None:
+                item = decode_scoreboard_item((entry, score))
+                item["rank"] = rank + 1
+                board_page.append(item)
+        available_pages = max(math.ceil(len(results) / SCOREBOARD_PAGE_LEN), 1)
+        return (board_page, page_number, available_pages)
+
+    results = search_scoreboard_cache(board_cache, pattern)
     board_page = results[start:end]
     for item in board_page:
         item["rank"] = board_cache.rank(item["key"], reverse=True) + 1
@@ -444,21 +1169,327 @@ def get_filtered_scoreboard_page(scoreboard_key, pattern, page_number=1):
     return (board_page, page_number, available_pages)
 
 
-def get_demographic_data():
-    """Get demographic information used in analytics"""
-    users = api.user.get_all_users()
+def iter_demographic_data(batch_size=EXPORT_BATCH_SIZE):
+    """
+    Iterate over the demographic information used in analytics.
 
-    result = []
-    for user in users:
-        result.append(
-            {
-                "usertype": user["usertype"],
-                "country": user["country"],
-                "gender": user["demo"].get("gender", ""),
-                "zipcode": user["demo"].get("zipcode", ""),
-                "grade": user["demo"].get("grade", ""),
-                "score": get_score(uid=user["uid"], time_weighted=False),
-            }
+    Args:
+        batch_size: users to fetch and score at a time
+    Returns:
+        generator of dicts with the DEMOGRAPHIC_FIELDS of each user
+    """
+    projection = {"usertype": 1, "country": 1, "demo": 1}
+    for user, score in _iter_scored_users(projection, batch_size):
+        yield {
+            "usertype": user["usertype"],
+            "country": user["country"],
+            "gender": user["demo"].get("gender", ""),
+            "zipcode": user["demo"].get("zipcode", ""),
+            "grade": user["demo"].get("grade", ""),
+            "score": score,
+        }
+
+
+class SolveMatrix(object):
+    """
+    Compact in-process view of every team's first solves.
+
+    Each team has a row bitset over the enabled problems, and each problem a
+    column bitset over the teams, so that category completion, solve counts
+    and "who solved X" queries are a few integer operations rather than
+    Mongo scans. Each row's solve times are kept alongside it, in the order
+    of its problems. Rebuilt from the team_solves ledger when its generation
+    changes, and extended incrementally with new solves otherwise. The rows
+    of teams whose solves were rebuilt or removed are replaced individually.
+    """
+
+    def __init__(self, generation, team_changes, solves, problems):
+        """
+        Create an empty matrix.
+
+        Args:
+            generation: the solve matrix generation this matrix belongs to
+            team_changes: the last team change sequence number it includes
+            solves: the last solve sequence number it includes
+            problems: the enabled problems, with pid and category
+        """
+        self.generation = generation
+        self.team_changes = team_changes
+        self.solves = solves
+        self.refreshed = 0
+        self.pids = [problem["pid"] for problem in problems]
+        self.pid_index = {pid: i for i, pid in enumerate(self.pids)}
+        self.categories = {problem["pid"]: problem["category"] for problem in problems}
+        self.category_masks = {}
+        for problem in problems:
+            self.category_masks[problem["category"]] = self.category_masks.get(
+                problem["category"], 0
+            ) | (1 << self.pid_index[problem["pid"]])
+        self.tids = []
+        self.tid_index = {}
+        self.rows = []
+        self.times = []
+        self.columns = [0] * len(self.pids)
+
+    @staticmethod
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+    def _bits(self, bits, values):
+        return [values[i] for i in range(bits.bit_length()) if bits >> i & 1]
+
+    def _row(self, tid):
+        return self.rows[self.tid_index[tid]] if tid in self.tid_index else 0
+
+    def _time_position(self, team, problem):
+        return self._popcount(self.rows[team] & ((1 << problem) - 1))
+
+    def add(self, tid, pid, solve_time):
+        """
+        Record a team's solve, if it is not already recorded.
+
+        Args:
+            tid: the team id
+            pid: the solved problem's pid
+            solve_time: time of the solve
+        """
+        if pid not in self.pid_index:
+            return
+        if tid not in self.tid_index:
+            self.tid_index[tid] = len(self.tids)
+            self.tids.append(tid)
+            self.rows.append(0)
+            self.times.append(array.array("q"))
+        team, problem = self.tid_index[tid], self.pid_index[pid]
+        if self.rows[team] >> problem & 1:
+            return
+        self.times[team].insert(
+            self._time_position(team, problem), int(solve_time.timestamp())
         )
+        self.rows[team] |= 1 << problem
+        self.columns[problem] |= 1 << team
+
+    def clear_team(self, tid):
+        """
+        Remove every solve of a team.
+
+        Args:
+            tid: the team id
+        """
+        if tid not in self.tid_index:
+            return
+        team = self.tid_index[tid]
+        for problem in self._bits(self.rows[team], range(len(self.pids))):
+            self.columns[problem] &= ~(1 << team)
+        self.rows[team] = 0
+        self.times[team] = array.array("q")
+
+    def solved_pids(self, tid):
+        """Get a team's solved pids, in the order they were solved."""
+        if tid not in self.tid_index:
+            return []
+        team = self.tid_index[tid]
+        problems = self._bits(self.rows[team], range(len(self.pids)))
+        return [
+            self.pids[problem] for _, problem in sorted(zip(self.times[team], problems))
+        ]
 
-    return result
+    def solvers(self, pid):
+        """Get the tids of the teams that solved a problem."""
+        return self._bits(self.columns[self.pid_index[pid]], self.tids)
+
+    def solve_count(self, pid):
+        """Get the number of teams that solved a problem."""
+        return self._popcount(self.columns[self.pid_index[pid]])
+
+    def first_solve_time(self, tid, pid):
+        """Get the timestamp of a team's solve, or None if unsolved."""
+        if tid not in self.tid_index or pid not in self.pid_index:
+            return None
+        team, problem = self.tid_index[tid], self.pid_index[pid]
+        if not self.rows[team] >> problem & 1:
+            return None
+        return self.times[team][self._time_position(team, problem)]
+
+    def category_solve_count(self, tid, category):
+        """Get the number of problems in a category a team has solved."""
+        return self._popcount(self._row(tid) & self.category_masks.get(category, 0))
+
+    def category_complete(self, tid, category):
+        """Whether a team has solved every problem in a category."""
+        mask = self.category_masks.get(category, 0)
+        return self._row(tid) & mask == mask
+
+    def solved_categories(self, tid):
+        """Get the categories in which a team has solved a problem."""
+        row = self._row(tid)
+        return {
+            category for category, mask in self.category_masks.items() if row & mask
+        }
+
+    def solve_percentile(self, tid):
+        """
+        Get the percentage of solving teams that have solved fewer problems
+        than a team.
+        """
+        solving = [row for row in self.rows if row]
+        if not solving:
+            return 0
+        solves = self._popcount(self._row(tid))
+        fewer = sum(1 for row in solving if self._popcount(row) < solves)
+        return 100 * fewer / len(solving)
+
+
+def reset_solve_matrix():
+    """Force every worker to rebuild its solve matrix."""
+    global __solve_matrix
+    __solve_matrix = None
+    get_conn().incr(SOLVE_MATRIX_GENERATION_KEY)
+
+
+def reload_team_solve_matrix(tid):
+    """
+    Replace a team's row of every worker's solve matrix from the ledger.
+
+    Called when a team's solves are rebuilt or removed, which the
+    incremental refresh of the matrix would not otherwise pick up.
+
+    Args:
+        tid: the team id
+    """
+    global __team_change_script
+    conn = get_conn()
+    if __team_change_script is None:
+        __team_change_script = conn.register_script(SOLVE_MATRIX_TEAM_CHANGE_SCRIPT)
+    __team_change_script(
+        keys=[SOLVE_MATRIX_TEAM_CHANGE_SEQUENCE_KEY, SOLVE_MATRIX_TEAM_CHANGES_KEY],
+        args=[tid],
+        client=conn,
+    )
+    if __solve_matrix is not None:
+        __solve_matrix.refreshed = 0
+
+
+def record_solve(tid, pid, solve_time):
+    """
+    Add a solve recorded in the ledger to every worker's solve matrix.
+
+    Added to this worker's matrix immediately, and to the others' when they
+    are next refreshed.
+
+    Args:
+        tid: the team id
+        pid: the solved problem's pid
+        solve_time: time of the solve
+    """
+    global __solve_script
+    conn = get_conn()
+    if __solve_script is None:
+        __solve_script = conn.register_script(SOLVE_MATRIX_SOLVE_SCRIPT)
+    __solve_script(
+        keys=[
+            SOLVE_MATRIX_SOLVE_SEQUENCE_KEY,
+            SOLVE_MATRIX_SOLVES_KEY,
+            SOLVE_MATRIX_SOLVES_TRIMMED_KEY,
+        ],
+        args=[json.dumps([tid, pid, solve_time.timestamp()]), SOLVE_MATRIX_SOLVES_LEN],
+        client=conn,
+    )
+    if __solve_matrix is not None:
+        __solve_matrix.add(tid, pid, solve_time)
+
+
+def get_solve_matrix(refresh=False):
+    """
+    Get this worker's solve matrix.
+
+    The matrix is checked for solves recorded since it was last refreshed at
+    most once every SOLVE_MATRIX_REFRESH_INTERVAL seconds. Solves recorded by
+    this worker are added to it immediately.
+
+    Args:
+        refresh: check the ledger now, e.g. for solves made by other workers
+    Returns:
+        the SolveMatrix
+    """
+    global __solve_matrix
+    matrix = __solve_matrix
+    now = time.time()
+    if (
+        matrix is not None
+        and not refresh
+        and now - matrix.refreshed < SOLVE_MATRIX_REFRESH_INTERVAL
+    ):
+        return matrix
+
+    db = api.db.get_conn()
+    pipe = get_conn().pipeline(transaction=False)
+    pipe.get(SOLVE_MATRIX_GENERATION_KEY)
+    pipe.get(SOLVE_MATRIX_TEAM_CHANGE_SEQUENCE_KEY)
+    pipe.get(SOLVE_MATRIX_SOLVE_SEQUENCE_KEY)
+    pipe.get(SOLVE_MATRIX_SOLVES_TRIMMED_KEY)
+    generation, team_changes, solves, trimmed = pipe.execute()
+    team_changes, solves = int(team_changes or 0), int(solves or 0)
+    changed_tids = []
+    if (
+        matrix is None
+        or matrix.generation != generation
+        or not int(trimmed or 0) <= matrix.solves <= solves
+    ):
+        # Solves are logged after they are in the ledger, so every solve up
+        # to the sequence number read above is included
+        matrix = SolveMatrix(
+            generation,
+            team_changes,
+            solves,
+            list(
+                db.problems.find(
+                    {"disabled": False}, {"_id": 0, "pid": 1, "category": 1}
+                )
+            ),
+        )
+        for solve in db.team_solves.find({}, {"_id": 0}):
+            matrix.add(solve["tid"], solve["pid"], solve["solve_time"])
+    elif solves > matrix.solves:
+        for entry in get_conn().zrangebyscore(
+            SOLVE_MATRIX_SOLVES_KEY, "({}".format(matrix.solves), solves
+        ):
+            tid, pid, solve_time = json.loads(entry)
+            matrix.add(tid, pid, datetime.datetime.fromtimestamp(solve_time))
+        matrix.solves = solves
+
+    if team_changes > matrix.team_changes:
+        changed_tids = [
+            tid.decode()
+            for tid in get_conn().zrangebyscore(
+                SOLVE_MATRIX_TEAM_CHANGES_KEY,
+                "({}".format(matrix.team_changes),
+                team_changes,
+            )
+        ]
+        matrix.team_changes = team_changes
+
+    # Replace the rows of the changed teams, after any of their removed
+    # solves were added above
+    for tid in changed_tids:
+        matrix.clear_team(tid)
+    if changed_tids:
+        for solve in db.team_solves.find({"tid": {"$in": changed_tids}}, {"_id": 0}):
+            matrix.add(solve["tid"], solve["pid"], solve["solve_time"])
+    matrix.refreshed = now
+    __solve_matrix = matrix
+    return matrix
+
+
+def get_pid_categories():
+    """Get a dict of pid: category for the enabled problems."""
+    return get_solve_matrix().categories
+
+
+def get_pids_by_category():
+    """Get a dict of category: [pids] for the enabled problems."""
+    matrix = get_solve_matrix()
+    return {
+        category: matrix._bits(mask, matrix.pids)
+        for category, mask in matrix.category_masks.items()
+    }
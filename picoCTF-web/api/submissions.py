@@ -2,6 +2,9 @@
 
 from datetime import datetime
 
+import pymongo
+from pymongo.errors import DuplicateKeyError
+
 import api
 from api import cache, check, log_action, PicoException, validate
 from api.cache import memoize
@@ -23,6 +26,9 @@ submission_schema = Schema(
 
 DEBUG_KEY = None
 
+# Recorded in the migrations collection once every team's ledger is built
+TEAM_SOLVES_MIGRATION = "team_solves"
+
 
 def grade_problem(pid, key, tid=None):
     """
@@ -95,12 +101,13 @@ def submit_key(tid, pid, key, method, uid, ip=None):
 
     correct, suspicious = grade_problem(pid, key, tid)
 
+    timestamp = datetime.utcnow()
     if not previously_solved_by_user:
         db.submissions.insert(
             {
                 "uid": uid,
                 "tid": tid,
-                "timestamp": datetime.utcnow(),
+                "timestamp": timestamp,
                 "pid": pid,
                 "ip": ip,
                 "key": key,
@@ -111,22 +118,23 @@ def submit_key(tid, pid, key, method, uid, ip=None):
             }
         )
 
+    if correct and not previously_solved_by_user:
+        cache.count_problem_solve(pid)
+
     if correct and not previously_solved_by_team:
-        # Immediately invalidate some caches
-        cache.invalidate(api.stats.get_score, tid)
-        cache.invalidate(api.stats.get_score, uid)
-        cache.invalidate(api.problem.get_unlocked_pids, tid)
-        cache.invalidate(
-            api.problem.get_solved_problems, tid=tid, uid=uid, category=None
-        )
-        cache.invalidate(
-            api.problem.get_solved_problems, tid=tid, uid=None, category=None
-        )
-        cache.invalidate(api.problem.get_solved_problems, tid=tid, uid=uid)
-        cache.invalidate(api.problem.get_solved_problems, tid=tid)
-        cache.invalidate(api.problem.get_solved_problems, uid=uid)
-        cache.invalidate(api.stats.get_score_progression, tid=tid, category=None)
-        cache.invalidate(api.stats.get_score_progression, tid=tid)
+        record_team_solve(tid, pid, timestamp)
+
+        # Immediately invalidate some caches. Every member's results
+        # include the team's solves, not just the submitter's.
+        cache.invalidate_many(tid=tid, uid=api.team.get_team_uids(tid=tid))
+
+        # Apply the new score to the scoreboards without waiting for the daemon
+        api.stats.update_team_scoreboards(tid)
+
+        if api.config.get_settings()["achievements"]["enable_achievements"]:
+            api.achievement.enqueue_achievement_event(
+                "submit", {"tid": tid, "uid": uid, "pid": pid}
+            )
 
     # if the solve is correct there is no need to maintain the container
     if correct:
@@ -143,6 +151,105 @@ def submit_key(tid, pid, key, method, uid, ip=None):
     return (correct, previously_solved_by_user, previously_solved_by_team)
 
 
+def record_team_solve(tid, pid, solve_time):
+    """
+    Record a solve in a team's solve ledger.
+
+    The team_solves collection holds one document per solved (tid, pid) pair
+    with the earliest solve time, so that a team's solves can be read without
+    scanning the submissions collection.
+
+    Args:
+        tid: the team id
+        pid: the solved problem's pid
+        solve_time: time of the correct submission
+    """
+    db = api.db.get_conn()
+    try:
+        db.team_solves.update_one(
+            {"tid": tid, "pid": pid}, {"$min": {"solve_time": solve_time}}, upsert=True
+        )
+    except DuplicateKeyError:
+        # Lost an upsert race with another member's solve - retry as update
+        db.team_solves.update_one(
+            {"tid": tid, "pid": pid}, {"$min": {"solve_time": solve_time}}
+        )
+    api.stats.record_solve(tid, pid, solve_time)
+
+
+def rebuild_team_solves(tid):
+    """
+    Rebuild a team's solve ledger from the submissions collection.
+
+    A team's solves include its own submissions as well as those its current
+    members made before joining it. Must be called whenever a team's members
+    change.
+
+    Args:
+        tid: the team id
+    """
+    db = api.db.get_conn()
+    members = api.team.get_team_uids(tid=tid)
+    solves = list(
+        db.submissions.aggregate(
+            [
+                {
+                    "$match": {
+                        "correct": True,
+                        "$or": [{"tid": tid}, {"uid": {"$in": members}}],
+                    }
+                },
+                {"$group": {"_id": "$pid", "solve_time": {"$min": "$timestamp"}}},
+            ]
+        )
+    )
+
+    if solves:
+        db.team_solves.bulk_write(
+            [
+                pymongo.UpdateOne(
+                    {"tid": tid, "pid": solve["_id"]},
+                    {"$set": {"solve_time": solve["solve_time"]}},
+                    upsert=True,
+                )
+                for solve in solves
+            ]
+        )
+    db.team_solves.delete_many(
+        {"tid": tid, "pid": {"$nin": [solve["_id"] for solve in solves]}}
+    )
+    api.stats.reload_team_solve_matrix(tid)
+
+
+def backfill_team_solves(force=False):
+    """
+    Build the solve ledger of every team, once per database.
+
+    Deployments that predate the ledger have submissions but no team_solves,
+    so every score would read as zero until this has run. Values cached from
+    the old ledger, such as those zero scores, are dropped for each team.
+
+    Args:
+        force: rebuild every team's ledger even if it was already built
+    Returns:
+        the number of teams rebuilt, 0 if the ledger was already built
+    """
+    db = api.db.get_conn()
+    if not force and db.migrations.find_one({"_id": TEAM_SOLVES_MIGRATION}) is not None:
+        return 0
+
+    tids = db.teams.distinct("tid")
+    for tid in tids:
+        rebuild_team_solves(tid)
+        cache.invalidate_many(tid=tid, uid=api.team.get_team_uids(tid=tid))
+    db.migrations.update_one(
+        {"_id": TEAM_SOLVES_MIGRATION},
+        {"$set": {"timestamp": datetime.utcnow()}},
+        upsert=True,
+    )
+    return len(tids)
+
+
 def get_submissions(
     pid=None, uid=None, tid=None, category=None, correctness=None, suspicious=None,
 ):
@@ -186,7 +293,7 @@ def get_submissions(
     return list(db.submissions.find(match, {"_id": 0}))
 
 
-@memoize
+@memoize(tags=("problems",))
 def get_suspicious_submissions(tid):
     """Get the suspicious submissions for a given team."""
     submissions = get_submissions(tid=tid, suspicious=True)
@@ -200,6 +307,8 @@ def clear_all_submissions():
     if DEBUG_KEY is not None:
         db = api.db.get_conn()
         db.submissions.remove()
+        db.team_solves.remove()
         api.cache.clear()
+        api.stats.reset_solve_matrix()
     else:
         raise PicoException("Debug mode must be enabled", 500)
@@ -45,20 +45,22 @@ def get_team(tid=None, name=None):
         name: team name
     Returns:
         Returns the corresponding team object or None if it could not be found
+
+    Lookups are memoized for the remainder of the current request.
     """
     db = api.db.get_conn()
 
-    match = {}
     if tid is not None:
-        match.update({"tid": tid})
+        key, match = ("team", "tid", tid), {"tid": tid}
     elif name is not None:
-        match.update({"team_name": name})
+        key, match = ("team", "name", name), {"team_name": name}
     elif api.user.is_logged_in():
-        match.update({"tid": api.user.get_user()["tid"]})
+        tid = api.user.get_user()["tid"]
+        key, match = ("team", "tid", tid), {"tid": tid}
     else:
         return None
 
-    return db.teams.find_one(match, {"_id": 0})
+    return cache.request_memo(key, lambda: db.teams.find_one(match, {"_id": 0}))
 
 
 def update_team(tid, updates):
@@ -77,6 +79,7 @@ def update_team(tid, updates):
     db = api.db.get_conn()
     if len(updates) > 0:
         success = db.teams.find_one_and_update({"tid": tid}, {"$set": updates})
+        cache.clear_request_memo()
         if not success:
             return None
     return tid
@@ -191,6 +194,7 @@ def create_team(params):
         )
 
     db.teams.insert(params)
+    cache.clear_request_memo()
 
     return params["tid"]
 
@@ -387,6 +391,7 @@ def join_team(team_name, password, user):
         new=True,
     )
 
+    cache.clear_request_memo()
     if not user_team_update:
         raise PicoException("There was an issue switching your team!")
 
@@ -400,6 +405,7 @@ def join_team(team_name, password, user):
     db.teams.find_one_and_update({"tid": desired_team["tid"]}, {"$inc": {"size": 1}})
 
     db.teams.find_one_and_update({"tid": current_team["tid"]}, {"$inc": {"size": -1}})
+    cache.clear_request_memo()
 
     # Remove old team from any groups and attempt to add new team
     previous_groups = get_groups(current_team["tid"])
@@ -415,31 +421,19 @@ def join_team(team_name, password, user):
             if not group_settings["email_filter"]:
                 api.group.join_group(gid=group["gid"], tid=desired_team["tid"])
 
-    # Immediately invalidate some caches
-    cache.invalidate(api.stats.get_score, desired_team["tid"])
-    cache.invalidate(api.stats.get_score, user["uid"])
-    cache.invalidate(api.problem.get_unlocked_pids, desired_team["tid"])
-    cache.invalidate(
-        api.problem.get_solved_problems,
-        tid=desired_team["tid"],
-        uid=user["uid"],
-        category=None,
-    )
-    cache.invalidate(
-        api.problem.get_solved_problems,
-        tid=desired_team["tid"],
-        uid=None,
-        category=None,
-    )
-    cache.invalidate(
-        api.problem.get_solved_problems, tid=desired_team["tid"], uid=user["uid"]
-    )
-    cache.invalidate(api.problem.get_solved_problems, tid=desired_team["tid"])
-    cache.invalidate(api.problem.get_solved_problems, uid=user["uid"])
-    cache.invalidate(
-        api.stats.get_score_progression, tid=desired_team["tid"], category=None
+    # Carry the user's previous solves over to the new team
+    api.submissions.rebuild_team_solves(desired_team["tid"])
+
+    # Immediately invalidate some caches, for the members of both teams
+    cache.invalidate_many(
+        tid=[current_team["tid"], desired_team["tid"]],
+        uid=get_team_uids(tid=current_team["tid"])
+        + get_team_uids(tid=desired_team["tid"]),
     )
-    cache.invalidate(api.stats.get_score_progression, tid=desired_team["tid"])
+
+    # Move the user's contribution between the teams' scoreboard entries
+    api.stats.update_team_scoreboards(current_team["tid"])
+    api.stats.update_team_scoreboards(desired_team["tid"])
 
     return desired_team["tid"]
 
@@ -469,6 +463,7 @@ def update_password_request(params):
         {"tid": user["tid"]},
         {"$set": {"password": api.common.hash_password(params["new-password"])}},
     )
+    cache.clear_request_memo()
 
 
 def is_teacher_team(tid):
@@ -488,10 +483,14 @@ def is_teacher_team(tid):
 @log_action
 def delete_team(tid):
     """Scrub all traces of a team."""
+    api.stats.update_team_scoreboards(tid, removed=True)
     db = api.db.get_conn()
     db.submissions.delete_many({"tid": tid})
+    db.team_solves.delete_many({"tid": tid})
+    api.stats.reload_team_solve_matrix(tid)
     db.problem_feedback.delete_many({"tid": tid})
     db.teams.find_one_and_delete({"tid": tid})
+    cache.clear_request_memo()
     for group in get_groups(tid):
         api.group.leave_group(group["gid"], tid)
     api.cache.invalidate(api.team.get_groups, tid)
@@ -546,11 +545,20 @@ def remove_member(tid, uid):
     db.teams.find_one_and_update({"tid": self_team_tid}, {"$inc": {"size": 1}})
 
     db.teams.find_one_and_update({"tid": tid}, {"$inc": {"size": -1}})
+    cache.clear_request_memo()
+
+    # The member's solves leave with them
+    api.submissions.rebuild_team_solves(self_team_tid)
+    api.submissions.rebuild_team_solves(tid)
+    cache.invalidate_many(tid=[tid, self_team_tid], uid=get_team_uids(tid) + [uid])
 
     # Delete the custom team if no members remain
     remaining_team_size = db.teams.find_one({"tid": tid}, {"size": 1})["size"]
     if remaining_team_size < 1:
         delete_team(tid)
+    else:
+        api.stats.update_team_scoreboards(tid)
+    api.stats.update_team_scoreboards(self_team_tid)
 
     # Copy any acquired group memberships back to the self-team
     for group in get_groups(tid):
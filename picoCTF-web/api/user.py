@@ -1,7 +1,9 @@
 """User management and registration module."""
 
 import json
+import math
 import re
+import time
 import urllib.parse
 import urllib.request
 from functools import wraps
@@ -73,6 +75,8 @@ def get_user(name=None, uid=None, include_pw_hash=False):
         include_pw_hash: include password hash in the dict
     Returns:
         Returns the corresponding user object or None if it could not be found
+
+    Lookups are memoized for the remainder of the current request.
     """
     db = api.db.get_conn()
 
@@ -80,18 +84,24 @@ def get_user(name=None, uid=None, include_pw_hash=False):
     if not include_pw_hash:
         projection["password_hash"] = 0
 
-    if uid is not None:
-        return db.users.find_one({"uid": uid}, projection)
-    elif name is not None:
-        return db.users.find_one(
-            {"username": name},
-            projection,
-            collation=Collation(locale="en", strength=CollationStrength.PRIMARY),
+    if uid is None and name is not None:
+        return cache.request_memo(
+            ("user", "name", name, include_pw_hash),
+            lambda: db.users.find_one(
+                {"username": name},
+                projection,
+                collation=Collation(locale="en", strength=CollationStrength.PRIMARY),
+            ),
         )
-    elif api.user.is_logged_in():
-        return db.users.find_one({"uid": session["uid"]}, projection)
-    else:
-        raise PicoException("Could not retrieve user - not logged in", 401)
+    if uid is None:
+        if not api.user.is_logged_in():
+            raise PicoException("Could not retrieve user - not logged in", 401)
+        uid = session["uid"]
+
+    return cache.request_memo(
+        ("user", "uid", uid, include_pw_hash),
+        lambda: db.users.find_one({"uid": uid}, projection),
+    )
 
 
 def get_users(email=None, parentemail=None, username=None, include_pw_hash=False):
@@ -247,6 +257,7 @@ def add_user(params, batch_registration=False):
         }
     )
     db.teams.update_one({"tid": tid}, {"$set": {"size": 1}})
+    cache.clear_request_memo()
 
     # The first registered user automatically becomes an admin
     user_is_admin = False
@@ -278,6 +289,7 @@ def add_user(params, batch_registration=False):
         "tokens": 0,
     }
     db.users.insert_one(user)
+    cache.clear_request_memo()
 
     # Determine the user team's initial eligibilities
     initial_eligibilities = [
@@ -288,6 +300,7 @@ def add_user(params, batch_registration=False):
     db.teams.find_one_and_update(
         {"tid": tid}, {"$set": {"eligibilities": initial_eligibilities}}
     )
+    cache.clear_request_memo()
 
     # If gid was specified, add the newly created team to the group
     if params.get("gid", None):
@@ -339,6 +352,7 @@ def verify_user(uid, token_value):
         db.users.find_one_and_update(
             {"uid": current_user["uid"]}, {"$set": {"verified": True}}
         )
+        cache.clear_request_memo()
         api.token.delete_token({"uid": current_user["uid"]}, "email_verification")
         return True
     else:
@@ -377,6 +391,7 @@ def update_password_request(params, uid=None, check_current=False):
         {"uid": user["uid"]},
         {"$set": {"password_hash": api.common.hash_password(params["new-password"])}},
     )
+    cache.clear_request_memo()
 
 
 @log_action
@@ -415,12 +430,14 @@ def disable_account(uid, disable_reason=None):
             }
         },
     )
+    cache.clear_request_memo()
 
     # Drop them from their team
     former_tid = api.user.get_team(uid=uid)["tid"]
     db.teams.find_one_and_update(
         {"tid": former_tid, "size": {"$gt": 0}}, {"$inc": {"size": -1}}
     )
+    cache.clear_request_memo()
 
     # Drop empty team from groups
     former_team = db.teams.find_one({"tid": former_tid})
@@ -429,22 +446,16 @@ def disable_account(uid, disable_reason=None):
         for group in groups:
             api.group.leave_group(gid=group["gid"], tid=former_tid)
 
+    api.submissions.rebuild_team_solves(former_tid)
+
     # Clean up cache
-    cache.invalidate(api.team.get_groups, former_tid)
-    cache.invalidate(api.stats.get_score, former_tid)
-    cache.invalidate(api.stats.get_score, uid)
-    cache.invalidate(api.problem.get_unlocked_pids, former_tid)
-    cache.invalidate(
-        api.problem.get_solved_problems, tid=former_tid, uid=uid, category=None
-    )
-    cache.invalidate(
-        api.problem.get_solved_problems, tid=former_tid, uid=None, category=None
+    cache.invalidate_many(
+        (api.team.get_groups, former_tid),
+        tid=former_tid,
+        uid=api.team.get_team_uids(tid=former_tid),
     )
-    cache.invalidate(api.problem.get_solved_problems, tid=former_tid, uid=uid)
-    cache.invalidate(api.problem.get_solved_problems, tid=former_tid)
-    cache.invalidate(api.problem.get_solved_problems, uid=uid)
-    cache.invalidate(api.stats.get_score_progression, tid=former_tid, category=None)
-    cache.invalidate(api.stats.get_score_progression, tid=former_tid)
+
+    api.stats.update_team_scoreboards(former_tid)
 
 
 def update_extdata(params):
@@ -460,6 +471,7 @@ def update_extdata(params):
     user = get_user(uid=None)
     db = api.db.get_conn()
     db.users.update_one({"uid": user["uid"]}, {"$set": {"extdata": params}})
+    cache.clear_request_memo()
 
 
 def reset_password(token_value, password, confirm_password):
@@ -612,17 +624,72 @@ def check_csrf(f):
     return wrapper
 
 
+# Sliding window log: one sorted set member per allowed request, scored by
+# its time in milliseconds. Requests over the limit are not recorded, so the
+# window drains on schedule under sustained traffic.
+# Returns {allowed, remaining, milliseconds until the oldest request expires}
+RATE_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call("zremrangebyscore", KEYS[1], "-inf", now - window)
+local count = redis.call("zcard", KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call("zadd", KEYS[1], now, ARGV[4])
+    redis.call("pexpire", KEYS[1], window)
+    count = count + 1
+    allowed = 1
+end
+local oldest = redis.call("zrange", KEYS[1], 0, 0, "withscores")
+local reset = window
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+return {allowed, limit - count, reset}
+"""
+
+__rate_limit_script = None
+
+
+def _check_rate_limit(key, limit, duration):
+    """
+    Record a request against a sliding window rate limit.
+
+    The script is registered once per process and run by SHA, so every
+    worker shares the same cached script on the server.
+
+    Args:
+        key: the rate limit key
+        limit: number of requests allowed within the window
+        duration: length of the window in seconds
+    Returns:
+        (allowed, remaining, seconds until a request is next allowed)
+    """
+    global __rate_limit_script
+    _db = cache.get_conn()
+    if __rate_limit_script is None:
+        __rate_limit_script = _db.register_script(RATE_LIMIT_SCRIPT)
+    now = int(time.time() * 1000)
+    allowed, remaining, reset = __rate_limit_script(
+        keys=[key],
+        args=[now, duration * 1000, limit, "{}:{}".format(now, api.common.token())],
+        client=_db,
+    )
+    return bool(allowed), remaining, math.ceil(reset / 1000)
+
+
 def rate_limit(limit=5, duration=60, by_ip=False, allow_bypass=False):
     """
     Limits requests per user or ip to specified limit threshold
-    with lingering duration/expiry (as opposed to rolling interval).
+    within a sliding window of the last duration seconds.
     Note that non-user IP limits should be more generous given shared IPs
     likely in school networks.
 
-    Does not use Walrus rate_limit to avoid having to instantiate new instance
-    per rate-limit target.
-    :param limit: number of requests allowed before limit is enforced
-    :param duration: expiration of last request before limit is reset
+    The check is a single atomic script call. The remaining quota is
+    exposed through the X-RateLimit-* response headers.
+    :param limit: number of requests allowed within the window
+    :param duration: length of the sliding window in seconds
     :param by_ip: force keying by ip. Note that requests out of user context
                   default to ip-based key
     :param allow_bypass: allow inclusion of bypass secret in HTTP header
@@ -650,13 +717,11 @@ def rate_limit(limit=5, duration=60, by_ip=False, allow_bypass=False):
                 if not by_ip:
                     key_id = current_user["uid"]
 
-            _db = cache.get_conn()
             key = "rate_limit:{}:{}".format(request.path, key_id)
-            # Avoid race conditions of setting (get-value + 1)
-            _db.incr(key)
-            _db.expire(key, duration)
-            count = int(_db.get(key))
-            if count is not None and count <= limit:
+            allowed, remaining, reset = _check_rate_limit(key, limit, duration)
+            # Added to the response by the after_request handler
+            flask.g.rate_limit = (limit, remaining, reset)
+            if allowed:
                 return f(*args, **kwargs)
             else:
                 limit_msg = (
@@ -678,6 +743,7 @@ def can_leave_team(uid):
         return False
     if current_team["creator"] == uid and current_team["size"] != 1:
         return False
-    if len(api.submissions.get_submissions(uid=uid)) > 0:
+    db = api.db.get_conn()
+    if db.submissions.find_one({"uid": uid}, {"_id": 1}) is not None:
         return False
     return True
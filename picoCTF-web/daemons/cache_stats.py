@@ -6,10 +6,13 @@ import api.group
 from api.stats import (
     get_all_team_scores,
     get_group_scores,
-    get_problem_solves,
+    get_hidden_tids,
     get_registration_count,
     get_top_teams_score_progressions,
+    publish_scoreboard_pages,
+    reconcile_problem_solves,
 )
+from api.submissions import backfill_team_solves
 import socket
 
 # How long after primary stat host falls off to allow another to take primary
@@ -37,12 +40,26 @@ def run():
         else:
             _cache.set("active_stat_host", host, COOLDOWN_TIME)
 
+        # Scores are read from the team solve ledger, so it must be built
+        # before anything below is computed
+        rebuilt = backfill_team_solves()
+        if rebuilt:
+            print("Built the solve ledger for", rebuilt, "teams")
+
+        deleted = api.cache.delete_legacy_scoreboard_caches()
+        if deleted:
+            print("Deleted", deleted, "legacy scoreboards")
+
         print("Caching registration stats...")
         cache(get_registration_count)
 
         print("Caching the scoreboards...")
+        hidden_tids = get_hidden_tids()
         for scoreboard in api.scoreboards.get_all_scoreboards():
-            get_all_team_scores(scoreboard_id=scoreboard["sid"])
+            get_all_team_scores(
+                scoreboard_id=scoreboard["sid"], hidden_tids=hidden_tids
+            )
+            publish_scoreboard_pages({"scoreboard_id": scoreboard["sid"]})
 
         print("Caching the score progressions for each scoreboard...")
         for scoreboard in api.scoreboards.get_all_scoreboards():
@@ -55,11 +72,13 @@ def run():
         print("Caching the scores and score progressions for each group...")
         for group in api.group.get_all_groups():
             get_group_scores(gid=group["gid"])
+            publish_scoreboard_pages({"group_id": group["gid"]})
             cache(get_top_teams_score_progressions, limit=5, group_id=group["gid"])
 
         print("Caching number of solves for each problem...")
+        solves = reconcile_problem_solves()
         for problem in api.problem.get_all_problems():
-            print(problem["name"], cache(get_problem_solves, problem["pid"]))
+            print(problem["name"], solves.get(problem["pid"], 0))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+
+import time
+
+import api
+from api.achievement import (
+    load_processors,
+    pop_achievement_events,
+    process_achievement_batch,
+)
+
+# Seconds to wait before polling an empty queue again
+POLL_INTERVAL = 1
+
+
+def run():
+    """Award achievements for queued events, a batch at a time."""
+    with api.create_app().app_context():
+        print("Loaded", load_processors(), "achievement processors")
+        print("Processing achievement events...")
+        while True:
+            events = pop_achievement_events()
+            if not events:
+                time.sleep(POLL_INTERVAL)
+                continue
+            earned = process_achievement_batch(events)
+            print("Processed", len(events), "events,", earned, "achievements earned")
+
+
+if __name__ == "__main__":
+    run()
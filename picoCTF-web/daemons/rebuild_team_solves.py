@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+
+import sys
+
+import api
+from api.submissions import backfill_team_solves
+
+
+def run(rebuild_all=False):
+    """
+    Backfill the team solve ledger from the submissions collection.
+
+    The cache_stats daemon runs the one-time backfill itself. Pass --all to
+    rebuild every team's ledger again regardless.
+    """
+    with api.create_app().app_context():
+        db = api.db.get_conn()
+
+        print("Rebuilding the solve ledger for each team...")
+        backfill_team_solves(force=rebuild_all)
+
+        print("Recorded", db.team_solves.count(), "team solves")
+
+
+if __name__ == "__main__":
+    run(rebuild_all="--all" in sys.argv[1:])
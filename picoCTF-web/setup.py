@@ -73,6 +73,7 @@ setup(
         "flask-restplus==0.13.0",
         "gunicorn==19.9.0",
         "marshmallow==3.0.1",
+        "msgpack==1.0.0",
         "py==1.10.0",
         "pymongo==3.9.0",
         "spur==0.3.21",
@@ -81,6 +82,7 @@ setup(
         "werkzeug<=0.16.1"
     ],
     extras_require={
+        "lz4": ["lz4"],
         "dev": [
             "black",
             "flake8",
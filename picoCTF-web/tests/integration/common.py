@@ -44,6 +44,8 @@ def clear_db():
     """Clear out the testing database."""
     db = get_conn()
     db.command("dropDatabase")
+    with app().app_context():
+        api.config.invalidate_settings()
 
 
 @pytest.fixture
@@ -723,6 +725,7 @@ def ensure_within_competition():
             }
         },
     )
+    api.config.invalidate_settings()
 
 
 def ensure_before_competition():
@@ -737,6 +740,7 @@ def ensure_before_competition():
             }
         },
     )
+    api.config.invalidate_settings()
 
 
 def ensure_after_competition():
@@ -751,6 +755,7 @@ def ensure_after_competition():
             }
         },
     )
+    api.config.invalidate_settings()
 
 
 def get_problem_key(pid, team_name):
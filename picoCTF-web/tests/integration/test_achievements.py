@@ -0,0 +1,124 @@
+"""Tests for the achievement event queue and batch processing."""
+from pytest_mongo import factories
+from pytest_redis import factories
+from .common import (  # noqa (fixture)
+    app,
+    clear_db,
+    client,
+    get_conn,
+    get_csrf_token,
+    register_test_accounts,
+    STUDENT_DEMOGRAPHICS,
+    load_sample_problems,
+    ensure_within_competition,
+    enable_sample_problems,
+    get_problem_key,
+    RATE_LIMIT_BYPASS_KEY,
+)
+import api
+
+SOLVED_PROCESSOR = """
+def process(api, data):
+    solved = api.stats.get_solve_matrix().solved_pids(data["tid"])
+    return data["pid"] in solved, {}
+"""
+
+REVIEWED_PROCESSOR = """
+def process(api, data):
+    return True, {"reviewed": data["pid"]}
+"""
+
+
+def add_achievement(name, processor, **kwargs):
+    """Insert an enabled achievement, along with its processor."""
+    return api.achievement.insert_achievement(
+        name=name,
+        score=10,
+        description=name,
+        processor=processor,
+        hidden=False,
+        image="",
+        smallimage="",
+        disabled=False,
+        **dict({"multiple": False}, **kwargs)
+    )
+
+
+def test_achievement_batches(
+    mongo_proc, redis_proc, client, tmp_path
+):  # noqa (fixture)
+    """Test that queued events are processed by the achievements of their type."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    (tmp_path / "solved.py").write_text(SOLVED_PROCESSOR)
+    (tmp_path / "reviewed.py").write_text(REVIEWED_PROCESSOR)
+    db = get_conn()
+    with app().app_context():
+        api.cache.clear()
+        api.config.get_settings()
+        db.settings.find_one_and_update(
+            {},
+            {
+                "$set": {
+                    "achievements.enable_achievements": True,
+                    "achievements.processor_base_path": str(tmp_path),
+                }
+            },
+        )
+        api.config.invalidate_settings()
+        solved_aid = add_achievement("Solved", "solved.py")
+        reviewed_aid = add_achievement(
+            "Reviewed", "reviewed.py", event="review", multiple=True
+        )
+
+    # Correct submissions queue a submit event
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+    pid = sorted(problem["pid"] for problem in client.get("/api/v1/problems").json)[0]
+    res = client.post(
+        "/api/v1/submissions",
+        json={
+            "pid": pid,
+            "key": get_problem_key(pid, STUDENT_DEMOGRAPHICS["username"]),
+            "method": "testing",
+        },
+        headers=[("X-CSRF-Token", csrf_t), ("Limit-Bypass", RATE_LIMIT_BYPASS_KEY)],
+    )
+    assert res.json["correct"] is True
+
+    with app().app_context():
+        user = api.user.get_user(name=STUDENT_DEMOGRAPHICS["username"])
+        data = {"tid": user["tid"], "uid": user["uid"], "pid": pid}
+        for _ in range(2):
+            api.achievement.enqueue_achievement_event("review", data)
+
+        # Events are popped oldest first, a batch at a time
+        events = api.achievement.pop_achievement_events(count=2)
+        assert events == [("submit", data), ("review", data)]
+        assert api.achievement.process_achievement_batch(events) == 2
+        events = api.achievement.pop_achievement_events(count=2)
+        assert events == [("review", data)]
+        assert api.achievement.pop_achievement_events() == []
+
+        # Achievements are only earned once, unless they allow multiple
+        events.append(("submit", data))
+        assert api.achievement.process_achievement_batch(events) == 1
+
+        earned = api.achievement.get_earned_achievement_instances(tid=user["tid"])
+        assert sorted(instance["aid"] for instance in earned) == sorted(
+            [solved_aid, reviewed_aid, reviewed_aid]
+        )
+        assert all(
+            instance["data"] == {"pid": pid, "reviewed": pid}
+            for instance in earned
+            if instance["aid"] == reviewed_aid
+        )
@@ -0,0 +1,267 @@
+"""Tests for memoization and invalidation in api.cache."""
+import datetime
+import threading
+import time
+
+from pytest_mongo import factories
+from pytest_redis import factories
+from .common import (  # noqa (fixture)
+    app,
+    clear_db,
+    client,
+    enable_sample_problems,
+    ensure_within_competition,
+    get_conn,
+    get_csrf_token,
+    get_problem_key,
+    load_sample_problems,
+    RATE_LIMIT_BYPASS_KEY,
+    register_test_accounts,
+    STUDENT_DEMOGRAPHICS,
+    STUDENT_2_DEMOGRAPHICS,
+)
+import api
+from api.cache import memoize
+
+calls = []
+
+
+@memoize(tags=("test_problems",))
+def tagged_value(x):
+    calls.append(("tagged", x))
+    return [x, len(calls)]
+
+
+@memoize(tags=("test_bundles",))
+def other_tagged_value(x):
+    calls.append(("other", x))
+    return [x, len(calls)]
+
+
+def test_tag_invalidation(mongo_proc, redis_proc):
+    """Test that invalidate_tags drops only the values carrying a tag."""
+    clear_db()
+    del calls[:]
+    with app().app_context():
+        api.cache.clear()
+        first = [tagged_value(1), tagged_value(2), other_tagged_value(1)]
+        assert [tagged_value(1), tagged_value(2), other_tagged_value(1)] == first
+        assert len(calls) == 3
+
+        api.cache.invalidate_tags("test_problems")
+        assert tagged_value(1) != first[0]
+        assert tagged_value(2) != first[1]
+        assert other_tagged_value(1) == first[2]
+        assert len(calls) == 5
+
+        # Invalidating a tag with nothing cached under it is harmless
+        api.cache.invalidate_tags("test_problems")
+        api.cache.invalidate_tags("test_problems")
+        tagged_value(1)
+        assert len(calls) == 6
+
+
+@memoize(single_flight=True)
+def slow_value(x):
+    calls.append(("slow", x))
+    time.sleep(0.3)
+    return [x, len(calls)]
+
+
+@memoize(stale_timeout=60)
+def stale_value(x):
+    calls.append(("stale", x))
+    return [x, len(calls)]
+
+
+def test_single_flight(mongo_proc, redis_proc):
+    """Test that concurrent misses compute a value only once."""
+    clear_db()
+    del calls[:]
+    flask_app = app()
+    with flask_app.app_context():
+        api.cache.clear()
+    results = []
+
+    def call():
+        with flask_app.app_context():
+            results.append(slow_value(1))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [("slow", 1)]
+    assert results == [[1, 1]] * 3
+    with flask_app.app_context():
+        assert not api.cache.get_conn().exists(
+            api.cache.LOCK_KEY % api.cache.make_key(slow_value, (1,), {})
+        )
+
+
+def test_serve_stale(mongo_proc, redis_proc):
+    """Test that the previous value is served while another worker recomputes."""
+    clear_db()
+    del calls[:]
+    with app().app_context():
+        api.cache.clear()
+        first = stale_value(1)
+        api.cache.invalidate(stale_value, 1)
+
+        # Another worker holds the lock, so the stale copy is served
+        conn = api.cache.get_conn()
+        lock_key = api.cache.LOCK_KEY % api.cache.make_key(stale_value, (1,), {})
+        conn.set(lock_key, "other worker")
+        assert stale_value(1) == first
+        assert len(calls) == 1
+
+        # Once the lock is free the value is computed again
+        conn.delete(lock_key)
+        assert stale_value(1) != first
+        assert len(calls) == 2
+
+
+@memoize(depends_on=("tid", "uid"))
+def dependent_value(tid=None, uid=None):
+    calls.append(("dependent", tid, uid))
+    return len(calls)
+
+
+def test_dependency_invalidation(mongo_proc, redis_proc):
+    """Test that invalidate_many drops the values for each listed id."""
+    clear_db()
+    del calls[:]
+    with app().app_context():
+        api.cache.clear()
+        values = [dependent_value(uid=uid) for uid in ["a", "b", "c"]]
+        team_value = dependent_value(tid="t")
+
+        api.cache.invalidate_many(uid=["a", "b"])
+        assert dependent_value(uid="a") != values[0]
+        assert dependent_value(uid="b") != values[1]
+        assert dependent_value(uid="c") == values[2]
+        assert dependent_value(tid="t") == team_value
+
+        api.cache.invalidate_many(tid="t")
+        assert dependent_value(tid="t") != team_value
+
+
+def test_teammate_solve_invalidation(mongo_proc, redis_proc, client):
+    """Test that a solve drops the cached solves of every team member."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    db = get_conn()
+    db.settings.find_one_and_update({}, {"$set": {"max_team_size": 2}})
+    with app().app_context():
+        api.config.invalidate_settings()
+        student = api.user.get_user(name=STUDENT_DEMOGRAPHICS["username"])
+        student_2 = api.user.get_user(name=STUDENT_2_DEMOGRAPHICS["username"])
+        tid = api.team.create_and_join_new_team("newteam", "newteam", student)
+        api.team.join_team("newteam", "newteam", student_2)
+        assert api.problem.get_solved_pids(uid=student_2["uid"]) == []
+
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+    pid = client.get("/api/v1/problems").json[0]["pid"]
+    res = client.post(
+        "/api/v1/submissions",
+        json={"pid": pid, "key": get_problem_key(pid, "newteam"), "method": "test"},
+        headers=[("X-CSRF-Token", csrf_t), ("Limit-Bypass", RATE_LIMIT_BYPASS_KEY)],
+    )
+    assert res.json["correct"] is True
+
+    with app().app_context():
+        assert api.problem.get_solved_pids(uid=student_2["uid"]) == [pid]
+        assert api.problem.get_solved_pids(tid=tid) == [pid]
+
+
+def test_cache_keys(mongo_proc, redis_proc):
+    """Test that a call has the same key however its arguments are passed."""
+    clear_db()
+    del calls[:]
+    with app().app_context():
+        api.cache.clear()
+        key = api.cache.make_key(dependent_value, ("t",), {})
+        assert key == "dependent_value:tid='t':uid=None"
+        assert api.cache.make_key(dependent_value, (), {"tid": "t"}) == key
+        assert api.cache.make_key(dependent_value, ("t", None), {}) == key
+
+        value = dependent_value(tid="t")
+        assert dependent_value("t") == value
+        api.cache.invalidate(dependent_value, "t")
+        assert dependent_value(tid="t") != value
+
+
+@memoize(serializer="msgpack")
+def msgpack_value(size):
+    calls.append(("msgpack", size))
+    return {
+        "time": datetime.datetime(2020, 1, 2, 3, 4, 5),
+        "scores": [{"score": i, "name": "team %d" % i} for i in range(size)],
+    }
+
+
+def test_msgpack_serializer(mongo_proc, redis_proc, monkeypatch):
+    """Test that values round-trip through msgpack, compressed or not."""
+    clear_db()
+    del calls[:]
+    serializer = api.cache.SERIALIZERS["msgpack"]
+    monkeypatch.setattr(api.cache, "lz4", None)
+
+    small, large = msgpack_value.__wrapped__(1), msgpack_value.__wrapped__(1000)
+    assert serializer.dumps(small)[:1] == serializer.RAW
+    assert serializer.dumps(large)[:1] == serializer.ZLIB
+    assert serializer.loads(serializer.dumps(small)) == small
+    assert serializer.loads(serializer.dumps(large)) == large
+
+    with app().app_context():
+        api.cache.clear()
+        del calls[:]
+        assert msgpack_value(1000) == large
+        assert msgpack_value(1000) == large
+        assert len(calls) == 1
+
+
+def test_cache_key_types(mongo_proc, redis_proc):
+    """Test that values of different types, or with separators, get own keys."""
+    clear_db()
+    del calls[:]
+    with app().app_context():
+        api.cache.clear()
+        for value, string in [(None, "None"), (1, "1"), (True, "True")]:
+            assert tagged_value(value)[0] is value
+            assert tagged_value(string)[0] == string
+        assert len(calls) == 6
+
+        assert api.cache.make_key(dependent_value, ("a:uid=b",), {}) != (
+            api.cache.make_key(dependent_value, ("a",), {"uid": "b"})
+        )
+
+
+def test_legacy_scoreboards(mongo_proc, redis_proc):
+    """Test that scoreboards keyed by a hash of their arguments are deleted."""
+    with app().app_context():
+        api.cache.clear()
+        conn = api.cache.get_conn()
+        legacy = "scoreboard:" + "0123456789abcdef" * 2
+        conn.zadd(legacy, {"team": 1})
+        board = api.cache.get_scoreboard_cache(scoreboard_id="sid")
+        board.add({"team": 1})
+
+        assert api.cache.delete_legacy_scoreboard_caches() == 1
+        assert not conn.exists(legacy)
+        assert len(board) == 1
+
+        # The scan only runs once
+        conn.zadd(legacy, {"team": 1})
+        assert api.cache.delete_legacy_scoreboard_caches() == 0
@@ -0,0 +1,263 @@
+"""Tests for the /api/v1/scoreboards endpoints."""
+import json
+import time
+
+from pytest_mongo import factories
+from pytest_redis import factories
+from .common import (  # noqa (fixture)
+    app,
+    clear_db,
+    client,
+    get_csrf_token,
+    register_test_accounts,
+    STUDENT_DEMOGRAPHICS,
+    STUDENT_2_DEMOGRAPHICS,
+    TEACHER_DEMOGRAPHICS,
+    load_sample_problems,
+    get_conn,
+    ensure_within_competition,
+    enable_sample_problems,
+    get_problem_key,
+    RATE_LIMIT_BYPASS_KEY,
+)
+import api
+import pytest
+from api import PicoException
+
+
+def setup_scoreboard():
+    """Add a scoreboard open to everyone, then the test accounts and problems."""
+    clear_db()
+    with app().app_context():
+        api.cache.clear()
+        sid = api.scoreboards.add_scoreboard("Global")
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    return sid
+
+
+def solve(client, demographics, count=1):
+    """Log in and solve the first count unlocked problems."""
+    client.get("/api/v1/user/logout")
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": demographics["username"],
+            "password": demographics["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+    pids = sorted(problem["pid"] for problem in client.get("/api/v1/problems").json)
+    for pid in pids[:count]:
+        res = client.post(
+            "/api/v1/submissions",
+            json={
+                "pid": pid,
+                "key": get_problem_key(pid, demographics["username"]),
+                "method": "testing",
+            },
+            headers=[("X-CSRF-Token", csrf_t), ("Limit-Bypass", RATE_LIMIT_BYPASS_KEY)],
+        )
+        assert res.json["correct"] is True
+
+
+def test_incremental_scoreboard_updates(
+    mongo_proc, redis_proc, client
+):  # noqa (fixture)
+    """Test that solves update the served scoreboards without a daemon rebuild."""
+    clear_db()
+    with app().app_context():
+        api.cache.clear()
+        sid = api.scoreboards.add_scoreboard("Global")
+        adult_sid = api.scoreboards.add_scoreboard("Adults", {"demo.age": "18+"})
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+
+    with app().app_context():
+        teacher = api.user.get_user(name=TEACHER_DEMOGRAPHICS["username"])
+        student = api.user.get_user(name=STUDENT_DEMOGRAPHICS["username"])
+        gid = api.group.create_group(teacher["tid"], "incremental")
+        api.group.join_group(gid, student["tid"])
+
+    solve(client, STUDENT_DEMOGRAPHICS)
+    solve(client, STUDENT_2_DEMOGRAPHICS, count=2)
+
+    def names(board):
+        return [
+            api.cache.decode_scoreboard_item(item)["name"]
+            for item in board.range(0, -1, with_scores=True, reverse=True)
+        ]
+
+    with app().app_context():
+        assert names(api.cache.get_scoreboard_cache(scoreboard_id=sid)) == [
+            STUDENT_2_DEMOGRAPHICS["username"],
+            STUDENT_DEMOGRAPHICS["username"],
+        ]
+        assert names(api.cache.get_scoreboard_cache(scoreboard_id=adult_sid)) == [
+            STUDENT_2_DEMOGRAPHICS["username"]
+        ]
+        assert names(api.cache.get_scoreboard_cache(group_id=gid)) == [
+            STUDENT_DEMOGRAPHICS["username"]
+        ]
+
+        # Only scoreboards which are served are updated
+        assert len(api.cache.get_scoreboard_cache(scoreboard_id=None)) == 0
+
+
+def test_scoreboard_page_freshness(
+    mongo_proc, redis_proc, client, monkeypatch
+):  # noqa (fixture)
+    """Test that solves rewrite the published pages which they change."""
+    sid = setup_scoreboard()
+    url = "/api/v1/scoreboards/{}/scoreboard".format(sid)
+    with app().app_context():
+        board = api.cache.get_scoreboard_cache(scoreboard_id=sid)
+        conn = api.cache.get_conn()
+        snapshot_key = api.cache.SCOREBOARD_PAGES_KEY % board.key
+        dirty_key = api.cache.SCOREBOARD_DIRTY_KEY % board.key
+        incomplete_key = api.cache.SCOREBOARD_INCOMPLETE_KEY % board.key
+        api.stats.publish_scoreboard_pages({"scoreboard_id": sid})
+        assert conn.hget(snapshot_key, "page:1") == b"[]"
+
+    solve(client, STUDENT_DEMOGRAPHICS)
+    with app().app_context():
+        page = json.loads(conn.hget(snapshot_key, "page:1"))
+        assert [entry["name"] for entry in page] == [STUDENT_DEMOGRAPHICS["username"]]
+        assert not conn.exists(dirty_key)
+
+        # Current pages are served as published
+        conn.hset(snapshot_key, "page:1", "[]")
+    res = client.get(url)
+    assert res.json["scoreboard"] == []
+    assert res.json["current_page"] == 1
+
+    # Pages left behind for too long are rendered from the live scoreboard
+    with app().app_context():
+        conn.set(dirty_key, time.time() - api.stats.SCOREBOARD_MAX_STALENESS - 1)
+    res = client.get(url)
+    assert [entry["name"] for entry in res.json["scoreboard"]] == [
+        STUDENT_DEMOGRAPHICS["username"]
+    ]
+
+    # Changes to too many pages are left to the daemon, not to readers
+    monkeypatch.setattr(api.stats, "SCOREBOARD_UPDATE_PAGES", 0)
+    with app().app_context():
+        conn.delete(dirty_key)
+    solve(client, STUDENT_2_DEMOGRAPHICS, count=2)
+    res = client.get(url)
+    assert res.json["scoreboard"] == []
+    with app().app_context():
+        assert conn.exists(dirty_key, incomplete_key) == 2
+        assert conn.hget(snapshot_key, "page:1") == b"[]"
+
+        api.stats.publish_scoreboard_pages({"scoreboard_id": sid})
+        assert not conn.exists(dirty_key, incomplete_key)
+    res = client.get(url)
+    assert [entry["name"] for entry in res.json["scoreboard"]] == [
+        STUDENT_2_DEMOGRAPHICS["username"],
+        STUDENT_DEMOGRAPHICS["username"],
+    ]
+
+
+def test_delete_group_scoreboard(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that deleting a group deletes its scoreboard and published pages."""
+    setup_scoreboard()
+    with app().app_context():
+        teacher = api.user.get_user(name=TEACHER_DEMOGRAPHICS["username"])
+        gid = api.group.create_group(teacher["tid"], "deleted")
+        api.stats.get_group_scores(gid=gid)
+        api.stats.publish_scoreboard_pages({"group_id": gid})
+        board = api.cache.get_scoreboard_cache(group_id=gid)
+        conn = api.cache.get_conn()
+        assert conn.exists(api.cache.SCOREBOARD_PAGES_KEY % board.key)
+
+        api.group.delete_group(gid)
+        assert not conn.exists(
+            board.key,
+            api.cache.SCOREBOARD_PAGES_KEY % board.key,
+            api.cache.SCOREBOARD_DIRTY_KEY % board.key,
+            api.cache.SCOREBOARD_INCOMPLETE_KEY % board.key,
+            api.cache.SCOREBOARD_CHANGES_KEY % board.key,
+            api.cache.SCOREBOARD_ADDED_KEY % board.key,
+        )
+
+
+def test_scoreboard_search_freshness(
+    mongo_proc, redis_proc, client, monkeypatch
+):  # noqa (fixture)
+    """Test that searches find teams added since the index was built."""
+    sid = setup_scoreboard()
+
+    def search(pattern):
+        res = client.get(
+            "/api/v1/scoreboards/{}/scoreboard?search={}".format(sid, pattern)
+        )
+        return [(entry["name"], entry["rank"]) for entry in res.json["scoreboard"]]
+
+    ranked = [
+        (STUDENT_2_DEMOGRAPHICS["username"], 1),
+        (STUDENT_DEMOGRAPHICS["username"], 2),
+    ]
+    assert search(STUDENT_DEMOGRAPHICS["username"]) == []
+    solve(client, STUDENT_DEMOGRAPHICS)
+    assert search(STUDENT_DEMOGRAPHICS["username"]) == [
+        (STUDENT_DEMOGRAPHICS["username"], 1)
+    ]
+    solve(client, STUDENT_2_DEMOGRAPHICS, count=2)
+    assert search(STUDENT_DEMOGRAPHICS["username"]) == ranked
+
+    # Stale indexes are rebuilt from the scoreboard
+    monkeypatch.setattr(api.stats, "SEARCH_INDEX_REBUILD_INTERVAL", 0)
+    with app().app_context():
+        board = api.cache.get_scoreboard_cache(scoreboard_id=sid)
+        conn = api.cache.get_conn()
+        conn.delete(api.cache.SCOREBOARD_ADDED_KEY % board.key)
+    assert search(STUDENT_DEMOGRAPHICS["username"]) == ranked
+
+    # and served by other threads while they are rebuilt
+    with app().app_context():
+        index = api.stats._get_search_index(board.key)
+        api.stats.__search_index_builds.add(board.key)
+        try:
+            assert api.stats._get_search_index(board.key) is index
+        finally:
+            api.stats.__search_index_builds.discard(board.key)
+        assert api.stats._get_search_index(board.key) is not index
+
+
+def test_score_progression_points(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test downsampling the top teams' score progressions."""
+    sid = setup_scoreboard()
+    solve(client, STUDENT_DEMOGRAPHICS, count=3)
+    url = "/api/v1/scoreboards/{}/score_progressions".format(sid)
+
+    res = client.get(url)
+    assert res.status_code == 200
+    progression = res.json[0]["score_progression"]
+    assert len(progression) == 3
+
+    res = client.get(url + "?points=2")
+    assert res.status_code == 200
+    assert res.json[0]["score_progression"] == [progression[0], progression[-1]]
+
+    res = client.get(url + "?points=0")
+    assert res.status_code == 400
+    with pytest.raises(PicoException):
+        api.stats.downsample_score_progressions([], points=0)
+
+    # The progressions are cached once, however many points are requested
+    assert client.get(url + "?points=1").json[0]["score_progression"] == [
+        progression[-1]
+    ]
+    with app().app_context():
+        key = api.cache.make_key(
+            api.stats.get_top_teams_score_progressions, (), {"scoreboard_id": sid}
+        )
+        cache = api.cache.get_cache()
+        assert api.cache.get_conn().keys(cache.make_key("get_top_teams_*")) == [
+            cache.make_key(key).encode()
+        ]
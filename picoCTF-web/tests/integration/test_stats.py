@@ -1,8 +1,14 @@
 """Tests for the /api/v1/stats endpoints."""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
 from pytest_mongo import factories
 from pytest_redis import factories
 from .common import (  # noqa (fixture)
     ADMIN_DEMOGRAPHICS,
+    app,
     clear_db,
     client,
     decode_response,
@@ -87,6 +93,7 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     api.config.get_settings()
     db = get_conn()
     db.settings.find_one_and_update({}, {"$set": {"max_team_size": 2}})
+    api.config.invalidate_settings()
     client.get("/api/v1/user/logout")
     client.post(
         "/api/v1/user/login",
@@ -127,3 +134,222 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     assert res.status_code == 200
     expected_response["groups"] += 1
     assert res.json == expected_response
+
+
+def test_stats_exports(mongo_proc, redis_proc, client, monkeypatch):  # noqa (fixture)
+    """Test the json, ndjson and csv formats of the stats exports."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+
+    # Solve a problem, so that a score is exported
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+    pid = sorted(problem["pid"] for problem in client.get("/api/v1/problems").json)[0]
+    res = client.post(
+        "/api/v1/submissions",
+        json={
+            "pid": pid,
+            "key": get_problem_key(pid, STUDENT_DEMOGRAPHICS["username"]),
+            "method": "testing",
+        },
+        headers=[("X-CSRF-Token", csrf_t), ("Limit-Bypass", RATE_LIMIT_BYPASS_KEY)],
+    )
+    assert res.json["correct"] is True
+    client.get("/api/v1/user/logout")
+    client.post(
+        "/api/v1/user/login",
+        json={
+            "username": ADMIN_DEMOGRAPHICS["username"],
+            "password": ADMIN_DEMOGRAPHICS["password"],
+        },
+    )
+
+    # Split the CSV output into several chunks
+    monkeypatch.setattr(api.apps.v1.stats, "CSV_CHUNK_ROWS", 2)
+
+    res = client.get("/api/v1/stats/demographics")
+    assert res.status_code == 200
+    assert res.mimetype == "application/json"
+    demographics = res.json
+    assert len(demographics) == 5
+    assert all(set(row) == set(api.stats.DEMOGRAPHIC_FIELDS) for row in demographics)
+    scores = sorted(row["score"] for row in demographics)
+    assert scores[:-1] == [0] * 4 and scores[-1] > 0
+
+    res = client.get("/api/v1/stats/demographics?format=ndjson")
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    lines = res.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == demographics
+
+    res = client.get("/api/v1/stats/demographics?format=csv")
+    assert res.status_code == 200
+    assert res.mimetype == "text/csv"
+    assert res.headers["Content-Disposition"] == (
+        "attachment; filename=demographics.csv"
+    )
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert rows == [{k: str(v) for k, v in row.items()} for row in demographics]
+
+    res = client.get("/api/v1/stats/submissions")
+    assert res.status_code == 200
+    submissions = res.json
+    solved = api.problem.get_problem(pid)["name"]
+    assert submissions[solved] == {"valid": 1, "invalid": 0}
+    assert all(
+        stats == {"valid": 0, "invalid": 0}
+        for name, stats in submissions.items()
+        if name != solved
+    )
+
+    res = client.get("/api/v1/stats/submissions?format=ndjson")
+    assert res.status_code == 200
+    assert {
+        row.pop("problem"): row
+        for row in map(json.loads, res.get_data(as_text=True).splitlines())
+    } == submissions
+
+    res = client.get("/api/v1/stats/submissions?format=csv")
+    assert res.status_code == 200
+    rows = csv.DictReader(io.StringIO(res.get_data(as_text=True)))
+    assert {
+        row["problem"]: {"valid": int(row["valid"]), "invalid": int(row["invalid"])}
+        for row in rows
+    } == submissions
+
+    res = client.get("/api/v1/stats/demographics?format=xml")
+    assert res.status_code == 400
+
+
+def test_solve_matrix_queries():
+    """Test the queries of a solve matrix."""
+    matrix = api.stats.SolveMatrix(
+        None,
+        0,
+        0,
+        [
+            {"pid": "a", "category": "Web"},
+            {"pid": "b", "category": "Web"},
+            {"pid": "c", "category": "Crypto"},
+        ],
+    )
+    start = datetime(2020, 1, 1)
+    matrix.add("t1", "b", start)
+    matrix.add("t1", "a", start + timedelta(seconds=1))
+    matrix.add("t2", "c", start + timedelta(seconds=2))
+    matrix.add("t2", "c", start + timedelta(seconds=3))
+    matrix.add("t2", "disabled", start)
+
+    assert matrix.solved_pids("t1") == ["b", "a"]
+    assert matrix.solved_pids("t3") == []
+    assert matrix.solvers("c") == ["t2"]
+    assert matrix.solve_count("a") == 1
+    assert matrix.first_solve_time("t2", "c") == int(
+        (start + timedelta(seconds=2)).timestamp()
+    )
+    assert matrix.first_solve_time("t2", "a") is None
+    assert matrix.category_solve_count("t1", "Web") == 2
+    assert matrix.category_complete("t1", "Web")
+    assert not matrix.category_complete("t2", "Web")
+    assert matrix.solved_categories("t2") == {"Crypto"}
+    assert matrix.solve_percentile("t1") == 50
+    assert matrix.solve_percentile("t2") == 0
+
+    # Cleared teams no longer count as solving teams
+    matrix.clear_team("t2")
+    assert matrix.solved_pids("t2") == []
+    assert matrix.solvers("c") == []
+    assert matrix.first_solve_time("t2", "c") is None
+    assert matrix.solve_percentile("t1") == 0
+
+
+def test_solve_matrix_refresh(
+    mongo_proc, redis_proc, client, monkeypatch
+):  # noqa (fixture)
+    """Test that solve matrices pick up solves and team changes."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    db = get_conn()
+    with app().app_context():
+        api.cache.clear()
+        tid = api.user.get_user(name=STUDENT_DEMOGRAPHICS["username"])["tid"]
+        pids = sorted(problem["pid"] for problem in api.problem.get_all_problems())
+        matrix = api.stats.get_solve_matrix(refresh=True)
+        assert matrix.solved_pids(tid) == []
+
+        # Solves recorded by this worker are added immediately
+        api.submissions.record_team_solve(tid, pids[0], datetime.utcnow())
+        assert api.stats.get_solve_matrix().solved_pids(tid) == [pids[0]]
+
+        # Solves recorded by other workers are added when refreshed
+        api.stats.__solve_matrix = None
+        api.submissions.record_team_solve(tid, pids[1], datetime.utcnow())
+        api.stats.__solve_matrix = matrix
+        assert api.stats.get_solve_matrix().solved_pids(tid) == [pids[0]]
+        assert api.stats.get_solve_matrix(refresh=True) is matrix
+        assert sorted(matrix.solved_pids(tid)) == pids[:2]
+
+        # Workers behind the solves still logged rebuild their matrix
+        monkeypatch.setattr(api.stats, "SOLVE_MATRIX_SOLVES_LEN", 1)
+        api.stats.__solve_matrix = None
+        api.submissions.record_team_solve(tid, pids[1], datetime.utcnow())
+        api.submissions.record_team_solve(tid, pids[1], datetime.utcnow())
+        api.stats.__solve_matrix = stale = matrix
+        matrix = api.stats.get_solve_matrix(refresh=True)
+        assert matrix is not stale
+        assert sorted(matrix.solved_pids(tid)) == pids[:2]
+
+        # Team changes replace the team's row, rather than the whole matrix
+        db.team_solves.delete_many({"tid": tid})
+        api.stats.reload_team_solve_matrix(tid)
+        assert api.stats.get_solve_matrix() is matrix
+        assert matrix.solved_pids(tid) == []
+        assert api.cache.get_conn().get(api.stats.SOLVE_MATRIX_GENERATION_KEY) is None
+
+        # Workers which have not seen the change yet replace the row too
+        db.team_solves.insert_one(
+            {"tid": tid, "pid": pids[2], "solve_time": datetime(2020, 1, 1)}
+        )
+        conn = api.cache.get_conn()
+        change = conn.incr(api.stats.SOLVE_MATRIX_TEAM_CHANGE_SEQUENCE_KEY)
+        conn.zadd(api.stats.SOLVE_MATRIX_TEAM_CHANGES_KEY, {tid: change})
+        assert api.stats.get_solve_matrix(refresh=True).solved_pids(tid) == [pids[2]]
+
+
+def test_problem_solve_counts(mongo_proc, redis_proc, monkeypatch):  # noqa (fixture)
+    """Test that solve counts are cached, even without any problems."""
+    clear_db()
+    with app().app_context():
+        api.cache.clear()
+        conn = api.cache.get_conn()
+        key = api.cache.get_problem_solves_cache().key
+
+        # Solves are not counted until the counts are cached
+        api.cache.count_problem_solve("pid")
+        assert not conn.exists(key)
+
+        assert api.stats.get_problem_solves_many(["pid"]) == {"pid": 0}
+        assert conn.exists(key)
+
+        def recount():
+            raise AssertionError("solves recounted")
+
+        monkeypatch.setattr(api.stats, "reconcile_problem_solves", recount)
+        api.cache.count_problem_solve("pid")
+        api.cache.count_problem_solve("pid")
+        assert api.stats.get_problem_solves_many(["pid", "other"]) == {
+            "pid": 2,
+            "other": 0,
+        }
@@ -18,6 +18,7 @@ from .common import (  # noqa (fixture)
     enable_sample_problems,
     get_problem_key,
     RATE_LIMIT_BYPASS_KEY,
+    app,
 )
 import api
 
@@ -109,6 +110,7 @@ def test_submission(mongo_proc, redis_proc, client):  # noqa (fixture)
     # Add another player to user's team and solve a problem with them
     api.config.get_settings()
     db.settings.find_one_and_update({}, {"$set": {"max_team_size": 2}})
+    api.config.invalidate_settings()
 
     client.post(
         "/api/v1/teams", json={"team_name": "newteam", "team_password": "newteam"}
@@ -232,3 +234,74 @@ def test_clear_all_submissions(mongo_proc, redis_proc, client):  # noqa (fixture
     assert res.json["success"] is True
     assert db.submissions.count_documents({}) == 0
     api.submissions.DEBUG_KEY = None
+
+
+def test_team_solve_ledger(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that correct submissions are recorded in the team solve ledger."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+    res = client.get("/api/v1/problems")
+    pid = sorted(problem["pid"] for problem in res.json)[0]
+    res = client.post(
+        "/api/v1/submissions",
+        json={
+            "pid": pid,
+            "key": get_problem_key(pid, STUDENT_DEMOGRAPHICS["username"]),
+            "method": "testing",
+        },
+        headers=[("X-CSRF-Token", csrf_t), ("Limit-Bypass", RATE_LIMIT_BYPASS_KEY)],
+    )
+    assert res.status_code == 201
+    assert res.json["correct"] is True
+
+    db = get_conn()
+    student = db.users.find_one({"username": STUDENT_DEMOGRAPHICS["username"]})
+    solves = list(db.team_solves.find({}, {"_id": 0}))
+    assert [(s["tid"], s["pid"]) for s in solves] == [(student["tid"], pid)]
+
+    # The solve moves to a new team along with the student
+    api.config.get_settings()
+    db.settings.find_one_and_update({}, {"$set": {"max_team_size": 2}})
+    api.config.invalidate_settings()
+    res = client.post(
+        "/api/v1/teams", json={"team_name": "newteam", "team_password": "newteam"}
+    )
+    assert res.status_code == 201
+    new_tid = db.users.find_one({"uid": student["uid"]})["tid"]
+    assert db.team_solves.find_one({"tid": new_tid, "pid": pid}) is not None
+
+    # A deployment predating the ledger is backfilled once, replacing the
+    # values workers cached while it was empty
+    db.team_solves.delete_many({})
+    with app().app_context():
+        api.cache.clear()
+        assert api.stats.get_score(tid=new_tid) == 0
+        assert api.problem.get_solved_problems(tid=new_tid) == []
+        assert api.problem.get_solved_problems(uid=student["uid"]) == []
+
+        assert api.submissions.backfill_team_solves() == db.teams.count_documents({})
+        assert db.team_solves.find_one({"tid": new_tid, "pid": pid}) is not None
+        assert api.stats.get_score(tid=new_tid) > 0
+        assert [p["pid"] for p in api.problem.get_solved_problems(tid=new_tid)] == [pid]
+        assert [
+            p["pid"] for p in api.problem.get_solved_problems(uid=student["uid"])
+        ] == [pid]
+        assert api.submissions.backfill_team_solves() == 0
+
+        # Rebuilds can be forced, and also replace cached values
+        db.team_solves.delete_many({})
+        api.cache.clear()
+        assert api.stats.get_score(tid=new_tid) == 0
+        assert api.submissions.backfill_team_solves(force=True) > 0
+        assert api.stats.get_score(tid=new_tid) > 0
@@ -231,6 +231,7 @@ def test_join_team(mongo_proc, redis_proc, client):  # noqa (fixture)
     api.config.get_settings()
     db = get_conn()
     db.settings.find_one_and_update({}, {"$set": {"max_team_size": 1}})
+    api.config.invalidate_settings()
     res = client.post(
         "/api/v1/team/join",
         json={"team_name": "newteam", "team_password": "newteam"},
@@ -239,11 +240,13 @@ def test_join_team(mongo_proc, redis_proc, client):  # noqa (fixture)
     assert res.status_code == 403
     assert res.json["message"] == "That team is already at maximum capacity."
     db.settings.find_one_and_update({}, {"$set": {"max_team_size": 5}})
+    api.config.invalidate_settings()
 
     # Attempt to join with incorrect password
     api.config.get_settings()
     db = get_conn()
     db.settings.find_one_and_update({}, {"$set": {"max_team_size": 2}})
+    api.config.invalidate_settings()
 
     res = client.post(
         "/api/v1/team/join",
@@ -309,6 +312,7 @@ def test_join_team(mongo_proc, redis_proc, client):  # noqa (fixture)
 #     api.config.get_settings()
 #     db = get_conn()
 #     db.settings.find_one_and_update({}, {'$set': {'max_team_size': 2}})
+#     api.config.invalidate_settings()
 
 #     # Create the new team that we will try to join
 #     res = client.post('/api/v1/teams', json={
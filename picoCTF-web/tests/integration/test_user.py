@@ -3,6 +3,7 @@ from pytest_mongo import factories
 from pytest_redis import factories
 from .common import (  # noqa (fixture)
     ADMIN_DEMOGRAPHICS,
+    app,
     clear_db,
     client,
     decode_response,
@@ -114,6 +115,9 @@ def test_login_rate_limit(mongo_proc, redis_proc, client):  # noqa (fixture)
         )
     assert res.status_code == 429
     assert match(regex, res.json["message"]) is not None
+    assert res.headers["X-RateLimit-Limit"] == "20"
+    assert res.headers["X-RateLimit-Remaining"] == "0"
+    assert 0 < int(res.headers["Retry-After"]) <= 15
 
     # Repeated attempts to login with an incorrect password, wrong bypass
     for _ in range(21):
@@ -547,3 +551,28 @@ def test_verify(mongo_proc, redis_proc, client):  # noqa (fixture)
     # Check that the token has been deleted from the database
     user_tokens = db.tokens.find_one({"uid": test_user["uid"]})
     assert len(user_tokens["tokens"]) == 0
+
+
+def test_sliding_window_rate_limit(mongo_proc, redis_proc, monkeypatch):  # noqa
+    """Test that the rate limit window slides and ignores rejected requests."""
+    now = [1000.0]
+    monkeypatch.setattr(api.user, "time", type("Clock", (), {"time": lambda: now[0]}))
+
+    def check(at):
+        now[0] = 1000 + at
+        return api.user._check_rate_limit("rate_limit:sliding_window_test", 3, 10)
+
+    with app().app_context():
+        api.cache.get_conn().delete("rate_limit:sliding_window_test")
+        assert check(0) == (True, 2, 10)
+        assert check(4) == (True, 1, 6)
+        assert check(8) == (True, 0, 2)
+
+        # Rejected requests do not extend the window
+        assert check(9) == (False, 0, 1)
+        assert check(9.5) == (False, 0, 1)
+
+        # Each request leaves the window its duration after it was made
+        assert check(10) == (True, 0, 4)
+        assert check(13) == (False, 0, 1)
+        assert check(14) == (True, 0, 4)
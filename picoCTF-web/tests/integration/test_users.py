@@ -77,6 +77,7 @@ def test_add_user(mongo_proc, redis_proc, client):  # noqa (fixture)
     db.settings.find_one_and_update(
         {}, {"$set": {"email.parent_verification_email": True}}
     )
+    api.config.invalidate_settings()
     res = client.post(
         "/api/v1/users",
         json={
@@ -2,13 +2,7 @@ def process(api, data):
     pid = data["pid"]
     pid_map = api.stats.get_pid_categories()
     category = pid_map[pid]
-    category_pids = api.stats.get_pids_by_category()[category]
-    solved_pids = api.problem.get_solved_pids(tid=data["tid"])
-
-    earned = True
-    for pid in category_pids:
-        if pid not in solved_pids:
-            earned = False
+    earned = api.stats.get_solve_matrix().category_complete(data["tid"], category)
 
     name = "Category Master"
     if category == "Cryptography":
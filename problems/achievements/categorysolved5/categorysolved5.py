@@ -2,13 +2,9 @@ def process(api, data):
     pid = data["pid"]
     pid_map = api.stats.get_pid_categories()
     category = pid_map[pid]
-    category_pids = api.stats.get_pids_by_category()[category]
-    solved_pids = api.problem.get_solved_pids(tid=data["tid"])
-
-    solve_count = 0
-    for pid in category_pids:
-        if pid in solved_pids:
-            solve_count += 1
+    solve_count = api.stats.get_solve_matrix().category_solve_count(
+        data["tid"], category
+    )
 
     earned = solve_count == 5
 